@@ -0,0 +1,169 @@
+###############################################################################
+# Name : batch_runner
+# Function : Runs the full council over a JSONL file of questions, a bounded
+#            number at a time, appending one JSON line per finished question
+#            to the output file. The output file is the checkpoint: rerunning
+#            with the same output skips every question already answered
+# Usage : python -m ai_council.batch_runner questions.jsonl results.jsonl [--concurrency 4]
+#         Input lines are {"question" : "...", "id" : optional}; without an id
+#         the line number is used, as "line-<n>"
+###############################################################################
+import argparse
+import asyncio
+import json
+import os
+import time
+import traceback
+from ai_council.constants import *
+from ai_council.council import run_council, run_sync, council_loop, awarm_up_models
+from ai_council.cache import CouncilCache
+from ai_council.parsing import output_text
+from ai_council.vector import get_vector_db
+
+
+###############################################################################
+# Name : load_questions
+# Function : Reads the input JSONL, skipping blank lines. Ids must be unique:
+#            a repeated id would be taken as already answered and skipped
+# Returns : list of (id, question)
+###############################################################################
+def load_questions(path):
+    questions = []
+    lines = {}          # id -> line it was first seen on
+    with open(path) as f:
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item_id = str(item["id"]) if "id" in item else f"line-{n}"
+            if item_id in lines:
+                raise ValueError(f"{path}:{n}: id {item_id!r} already used on line {lines[item_id]}")
+            lines[item_id] = n
+            questions.append((item_id, item["question"]))
+    return questions
+
+###############################################################################
+# Name : load_checkpoint
+# Function : Ids already answered in the output file. Failed items are not
+#            counted so they run again, and a line cut off by a crash is ignored
+# Returns : set of ids
+###############################################################################
+def load_checkpoint(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" in record:
+                done.discard(record["id"])
+            else:
+                done.add(record["id"])
+    return done
+
+###############################################################################
+# Name : result_record
+# Function : JSON-serializable summary of one council run
+# Returns : dict
+###############################################################################
+def result_record(item_id, question, result, seconds):
+    best = result["best_response"]
+    return {
+        "id" : item_id,
+        "question" : question,
+        "answer" : output_text(best["text"]),
+        "best_response_id" : best["response_id"],
+        "best_model_id" : best["model_id"],
+        "tier" : result.get("tier"),
+        "averages" : result["averages"],
+        "responses" : {r["response_id"] : output_text(r["text"]) for r in result["responses"]},
+        "scoring_matrix" : result["scoring_matrix"],
+        "audit" : result["audit"],
+        "sources" : [{"source" : doc.metadata.get("source"), "page" : doc.metadata.get("page")} for doc in result["context"]],
+        "seconds" : seconds,
+        "timings" : result.get("timings")
+    }
+
+class BatchWriter:
+    """
+    Appends records to the output file, one flushed and synced line per question, so a crash
+    loses at most the questions still in flight.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.f = open(path, "a")
+
+    def write(self, record):
+        self.f.write(json.dumps(record, default=str) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+async def run_batch(questions, vs, writer, concurrency=4, cache=None, **council_options):
+    """
+    Runs the council over the questions with at most concurrency questions in flight.
+    Calls per model stay capped by CONCURRENCY_LIMITS across all questions.
+    Returns (answered, failed).
+    """
+    slots = asyncio.Semaphore(concurrency)
+    counts = {"answered" : 0, "failed" : 0}
+
+    async def one(item_id, question):
+        async with slots:
+            started = time.perf_counter()
+            try:
+                result = await run_council(question, vs, cache=cache, **council_options)
+                writer.write(result_record(item_id, question, result, time.perf_counter() - started))
+                counts["answered"] += 1
+            except Exception as e:
+                writer.write({"id" : item_id, "question" : question, "error" : str(e), "traceback" : traceback.format_exc()})
+                counts["failed"] += 1
+            print(f"{counts['answered'] + counts['failed']}/{len(questions)} questions done ({counts['failed']} failed)")
+
+    await asyncio.gather(*(one(item_id, question) for item_id, question in questions))
+    return counts["answered"], counts["failed"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AI council over a JSONL file of questions")
+    parser.add_argument("input", help="JSONL with one {\"question\", \"id\"} object per line")
+    parser.add_argument("output", help="JSONL results file, also the checkpoint to resume from")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight at once")
+    parser.add_argument("--limit", type=int, default=None, help="only run the first N unanswered questions")
+    parser.add_argument("--no-cache", action="store_true", help="do not reuse answers to repeated questions")
+    parser.add_argument("--batched", action="store_true", default=BATCHED_SCORING, help="batched scoring")
+    parser.add_argument("--adaptive", action="store_true", default=ADAPTIVE_SCORING, help="adaptive early-stopping judging")
+    parser.add_argument("--cascade", action="store_true", default=CASCADE, help="cheap expert first, full council when unsure")
+    args = parser.parse_args()
+
+    questions = load_questions(args.input)
+    done = load_checkpoint(args.output)
+    pending = [(item_id, question) for item_id, question in questions if item_id not in done]
+    answered = len(questions) - len(pending)
+    if args.limit is not None:
+        pending = pending[:args.limit]
+    print(f"{len(questions)} questions, {answered} already answered, {len(pending)} to run")
+    if not pending:
+        return
+
+    warm_up = asyncio.run_coroutine_threadsafe(awarm_up_models(), council_loop()) if WARM_UP_MODELS else None
+    vs = get_vector_db()
+    if warm_up is not None:
+        skipped = [name for name, seconds in warm_up.result().items() if seconds is None]
+        if skipped:
+            print("Warm-up skipped, these load on first use: " + ", ".join(skipped))
+    cache = None if args.no_cache else CouncilCache(embeddings=vs.embeddings)
+    writer = BatchWriter(args.output)
+    try:
+        answered, failed = run_sync(run_batch(pending, vs, writer, args.concurrency, cache,
+                                              batched=args.batched, adaptive=args.adaptive, cascade=args.cascade))
+    finally:
+        writer.close()
+    print(f"Batch complete: {answered} answered, {failed} failed, results in {args.output}")
+
+if __name__ == "__main__":
+    main()
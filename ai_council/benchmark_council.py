@@ -0,0 +1,188 @@
+###############################################################################
+# Name : benchmark_council
+# Function : End-to-end council benchmark on the fake models and embeddings
+#            (fake_llm), so it runs offline: per-stage latency, LLM calls per
+#            question, parse failures and questions per second for several
+#            council sizes. Measures the council's own overhead and catches
+#            regressions without Ollama or OpenAI
+# Usage : python -m ai_council.benchmark_council [--sizes 2 4 8] [--questions 20]
+###############################################################################
+import os
+os.environ["AI_COUNCIL_FAKE_MODELS"] = "1"      # must be set before constants is imported
+import argparse
+import json
+import random
+import time
+import numpy as np
+from langchain_core.documents import Document
+import ai_council.council as council
+from ai_council.batch_runner import run_batch
+from ai_council.cache import CouncilCache
+from ai_council.retrieval import ahybrid_search
+from ai_council.fake_llm import fake_models, fake_stats, DEFAULT_LATENCY
+from ai_council.vector import get_embeddings, new_vector_store, index_build_config
+
+PARTIES = ["Supplier", "Customer", "Licensor", "Licensee", "Contractor", "Indemnified Party"]
+DUTIES = ["notify", "indemnify", "pay", "deliver", "audit", "insure", "terminate", "remedy"]
+OBJECTS = ["the invoice", "the goods", "any breach", "the confidential information", "the premises", "the licence fee"]
+
+
+###############################################################################
+# Name : synthetic_corpus
+# Function : Contract-like chunks with clause numbers and defined terms, so
+#            both the lexical and the vector retriever have something to find
+# Returns : list of Documents
+###############################################################################
+def synthetic_corpus(n_chunks, seed=0):
+    rng = random.Random(seed)
+    docs = []
+    for n in range(n_chunks):
+        clause = f"{n // 10 + 1}.{n % 10 + 1}"
+        sentences = [f"Clause {clause}. The {rng.choice(PARTIES)} shall {rng.choice(DUTIES)} {rng.choice(OBJECTS)} "
+                     f"within {rng.choice([5, 10, 30, 60, 90])} days of {rng.choice(['written notice', 'delivery', 'termination', 'invoice'])}."
+                     for _ in range(6)]
+        docs.append(Document(page_content=" ".join(sentences),
+                             metadata={"source" : f"Data/contract_{n // 40 + 1}.pdf", "page" : n % 40}))
+    return docs
+
+def build_store(docs):
+    embeddings = get_embeddings()
+    vectors = np.asarray(embeddings.embed_documents([d.page_content for d in docs]), dtype="float32")
+    vs = new_vector_store(embeddings, vectors, index_build_config(), docstore_path=":memory:")
+    vs.add_embeddings([(d.page_content, v) for d, v in zip(docs, vectors.tolist())],
+                      metadatas=[d.metadata for d in docs], ids=[f"chunk:{i}" for i in range(len(docs))])
+    return vs
+
+def synthetic_questions(docs, n, seed=1):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(n):
+        doc = rng.choice(docs)
+        clause = doc.page_content.split(".", 2)[0].replace("Clause ", "") + "." + doc.page_content.split(".", 2)[1]
+        questions.append((str(i), f"What does clause {clause} require the {rng.choice(PARTIES)} to do?"))
+    return questions
+
+###############################################################################
+# Name : check_audited_totals
+# Function : The averages of an audited scoring matrix are the ones the audit
+#            produced: compute_average_totals must average the normalized
+#            totals stored in the cells, not recompute them from the scores
+###############################################################################
+def check_audited_totals():
+    def cell(score):
+        return {"scores" : {c : score for c in council.WEIGHTS}, "total" : score * sum(council.WEIGHTS.values())}
+    scoring_matrix = {"judge_a" : {"r_0" : cell(4), "r_1" : cell(4)},
+                      "judge_b" : {"r_0" : cell(2), "r_1" : cell(3)},
+                      "judge_c" : {"r_0" : cell(1), "r_1" : cell(5)}}
+    audit = json.dumps({"audit_id" : "check", "flags" : [], "drops" : ["judge_c"], "explanation" : "",
+                        "normalization" : {"judge_a" : 0.5}})
+    responses = [{"response_id" : "r_0"}, {"response_id" : "r_1"}]
+    normalized, averages, _ = council.audited_scoring_matrix(audit, scoring_matrix, responses)
+    recomputed = council.compute_average_totals(normalized)
+    if set(recomputed) != set(averages) or not all(np.isclose(recomputed[r], averages[r]) for r in averages):
+        raise AssertionError(f"compute_average_totals gives {recomputed} for audited averages {averages}")
+
+###############################################################################
+# Name : check_paraphrase_cache
+# Function : Paraphrases retrieve the same chunks in another order, or with one
+#            swapped, and must still hit the council cache; a question sharing
+#            only half its chunks must not. The fake embeddings are hashed bags
+#            of words, so paraphrases score lower than on a real embedding model
+###############################################################################
+def check_paraphrase_cache():
+    vs = build_store(synthetic_corpus(400))
+    pairs = [("What does clause 14.7 require the Indemnified Party to do?", "Which duties does clause 14.7 require the Indemnified Party?", True),
+             ("What does clause 7.9 require the Contractor to do?", "Which duties does clause 7.9 require the Contractor?", True),
+             ("What does clause 2.5 require the Licensee to do?", "Which duties does clause 2.5 require the Licensee?", False)]
+
+    async def lookup(question, paraphrase):
+        cache = CouncilCache(embeddings=vs.embeddings, similarity_threshold=0.7)
+        await cache.aput(question, await ahybrid_search(vs, question, k=council.CONTEXT_CANDIDATES), {"question" : question})
+        return await cache.aget(paraphrase, await ahybrid_search(vs, paraphrase, k=council.CONTEXT_CANDIDATES))
+
+    for question, paraphrase, hit in pairs:
+        if (council.run_sync(lookup(question, paraphrase)) is not None) != hit:
+            raise AssertionError(f"{paraphrase!r} should {'' if hit else 'not '}hit the cached run of {question!r}")
+
+class MemoryWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+###############################################################################
+# Name : benchmark_size
+# Function : Runs the questions through a council of n_experts fake experts
+# Returns : dict of results
+###############################################################################
+def benchmark_size(vs, questions, n_experts, args):
+    latency = {kind : (median * args.latency_scale, sigma) for kind, (median, sigma) in DEFAULT_LATENCY.items()}
+    council.MODELS[:] = fake_models(n_experts, latency=latency, malformed_rate=args.malformed, backend=args.backend)
+    fake_stats.clear()
+    for key in council.parse_stats:
+        council.parse_stats[key] = 0
+    writer = MemoryWriter()
+    started = time.perf_counter()
+    answered, failed = council.run_sync(run_batch(questions, vs, writer, args.concurrency, None,
+                                                  batched=args.mode == "batched", adaptive=args.mode == "adaptive",
+                                                  cascade=args.mode == "cascade"))
+    wall = time.perf_counter() - started
+
+    records = [r for r in writer.records if "error" not in r]
+    stages = {}
+    for record in records:
+        for name, seconds in record["timings"].items():
+            stages.setdefault(name, []).append(seconds)
+    parses = sum(council.parse_stats.values())
+    calls = {key.split(":", 1)[1] : count for key, count in fake_stats.items() if key.startswith("calls:")}
+    return {
+        "experts" : n_experts,
+        "answered" : answered,
+        "failed" : failed,
+        "qps" : len(questions) / wall,
+        "latency" : [r["seconds"] for r in records],
+        "stages" : stages,
+        "calls" : calls,
+        "calls_per_question" : sum(calls.values()) / len(questions),
+        "parse_failure_rate" : council.parse_stats["failed"] / parses if parses else 0.0,
+        "repair_rate" : council.parse_stats["repaired"] / parses if parses else 0.0,
+        "cascade_share" : sum(r["tier"] == "cascade" for r in records) / len(records) if records else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end council benchmark on fake models, no network needed")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[2, 4, 8], help="numbers of experts to try")
+    parser.add_argument("--questions", type=int, default=20, help="questions per council size")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight at once")
+    parser.add_argument("--chunks", type=int, default=400, help="chunks in the synthetic corpus")
+    parser.add_argument("--mode", choices=["pipelined", "batched", "adaptive", "cascade"], default="pipelined")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplies the fake latency medians (0 = overhead only)")
+    parser.add_argument("--malformed", type=float, default=0.05, help="share of malformed judge and auditor replies")
+    parser.add_argument("--backend", default="ollama", help="CONCURRENCY_LIMITS entry the fake models are capped by")
+    args = parser.parse_args()
+
+    check_audited_totals()
+    check_paraphrase_cache()
+    docs = synthetic_corpus(args.chunks)
+    vs = build_store(docs)
+    questions = synthetic_questions(docs, args.questions)
+    print(f"{args.questions} questions, {args.chunks} chunks, mode {args.mode}, backend {args.backend}, "
+          f"latency x{args.latency_scale}, {args.malformed:.0%} malformed")
+
+    results = [benchmark_size(vs, questions, n, args) for n in args.sizes]
+    print(f"\n{'experts':>8}{'q/s':>8}{'p50 s':>8}{'p95 s':>8}{'calls/q':>9}{'repaired':>10}{'lost':>7}{'failed':>8}")
+    for r in results:
+        p50, p95 = np.percentile(r["latency"], [50, 95]) if r["latency"] else (float("nan"), float("nan"))
+        print(f"{r['experts']:>8}{r['qps']:>8.2f}{p50:>8.3f}{p95:>8.3f}{r['calls_per_question']:>9.1f}"
+              f"{r['repair_rate']:>10.1%}{r['parse_failure_rate']:>7.1%}{r['failed']:>8}")
+    for r in results:
+        print(f"\n{r['experts']} experts, mean (p95) seconds per stage:")
+        for name, seconds in r["stages"].items():
+            print(f"  {name:<20}{np.mean(seconds):>8.3f} ({np.percentile(seconds, 95):.3f})")
+        print("  calls per question: " + ", ".join(f"{kind} {count / args.questions:.1f}" for kind, count in sorted(r["calls"].items())))
+        if args.mode == "cascade":
+            print(f"  answered by the cascade tier: {r['cascade_share']:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+###############################################################################
+# Name : benchmark_index
+# Function : Compares FAISS index types against the exact flat index on the
+#            current corpus (or synthetic vectors): recall@k, p50/p99 single
+#            query latency and serialized index size
+# Usage : python -m ai_council.benchmark_index [--k 4] [--synthetic 100000]
+###############################################################################
+import argparse
+import time
+import numpy as np
+import faiss
+from ai_council.constants import *
+from ai_council.vector import build_faiss_index, get_embeddings, load_manifest, load_vector_db
+
+
+###############################################################################
+# Name : corpus_vectors
+# Function : Embeddings of every chunk in the saved vector db, served from the
+#            embedding cache after the first build
+# Returns : float32 array (n, dim)
+###############################################################################
+def corpus_vectors():
+    embeddings = get_embeddings()
+    vs = load_vector_db(embeddings)
+    texts = [vs.docstore.search(doc_id).page_content for doc_id in vs.index_to_docstore_id.values()]
+    return np.asarray(embeddings.embed_documents(texts), dtype="float32")
+
+###############################################################################
+# Name : synthetic_vectors
+# Function : Clustered gaussian vectors, to try operating points on corpus
+#            sizes we do not have yet
+# Returns : float32 array (n, dim)
+###############################################################################
+def synthetic_vectors(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 100), dim))
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.normal(size=(n, dim))
+    return vectors.astype("float32")
+
+###############################################################################
+# Name : benchmark
+# Function : Builds one index on the vectors and measures it against the
+#            exact neighbours
+# Returns : dict of results
+###############################################################################
+def benchmark(config, vectors, queries, truth, k):
+    started = time.perf_counter()
+    index = build_faiss_index(vectors, config)
+    index.add(vectors)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    found = []
+    for query in queries:
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        found.append(ids[0])
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return {
+        "recall" : recall,
+        "p50_ms" : 1000 * np.percentile(latencies, 50),
+        "p99_ms" : 1000 * np.percentile(latencies, 99),
+        "size_mb" : faiss.serialize_index(index).nbytes / 2 ** 20,
+        "build_s" : build_seconds
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of FAISS index types against the flat index")
+    parser.add_argument("--k", type=int, default=4, help="neighbours per query (similarity_search default is 4)")
+    parser.add_argument("--queries", type=int, default=200, help="query vectors sampled from the corpus")
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark this many synthetic vectors instead of the corpus")
+    parser.add_argument("--dim", type=int, default=1024, help="dimension of synthetic vectors")
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 4, 16, 64], help="IVF nprobe values to try")
+    parser.add_argument("--ef-search", type=int, nargs="*", default=[16, 64, 256], help="HNSW efSearch values to try")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        if load_manifest() is None:
+            raise SystemExit("No vector DB found, build it first or pass --synthetic")
+        vectors = corpus_vectors()
+    rng = np.random.default_rng(1)
+    # Perturbed corpus vectors stand in for questions about the corpus
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.05 * np.std(vectors) * rng.normal(size=queries.shape).astype("float32")
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    configs = [{**VECTOR_INDEX, "type" : "flat"}]
+    configs += [{**VECTOR_INDEX, "type" : "ivf_flat", "nprobe" : p} for p in args.nprobe]
+    configs += [{**VECTOR_INDEX, "type" : "ivf_pq", "nprobe" : p} for p in args.nprobe]
+    configs += [{**VECTOR_INDEX, "type" : "hnsw", "ef_search" : ef} for ef in args.ef_search]
+
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<10}{'nprobe/ef':>10}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}{'size MB':>9}{'build s':>9}")
+    for config in configs:
+        result = benchmark(config, vectors, queries, truth, args.k)
+        setting = {"ivf_flat" : config["nprobe"], "ivf_pq" : config["nprobe"], "hnsw" : config["ef_search"]}.get(config["type"], "-")
+        print(f"{config['type']:<10}{setting:>10}{result['recall']:>10.3f}{result['p50_ms']:>9.3f}{result['p99_ms']:>9.3f}"
+              f"{result['size_mb']:>9.2f}{result['build_s']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+###############################################################################
+# Name : benchmark_parsing
+# Function : Parse success rate and parse time of judge/auditor outputs, old
+#            literal_eval path against the tolerant parser. Uses the outputs
+#            recorded in JUDGE_OUTPUT_LOG plus malformed variants of them
+#            (fences, comments, trailing commas, single quotes, truncation)
+# Usage : python -m ai_council.benchmark_parsing [--corpus judge_outputs.jsonl]
+###############################################################################
+import argparse
+import ast
+import json
+import os
+import re
+import time
+import numpy as np
+from ai_council.constants import *
+from ai_council.prompts import scoring_output, batch_scoring_output, Audit_Report
+from ai_council.council import extract_first_curly_balanced
+from ai_council.parsing import parse_output
+
+SCHEMAS = {schema.__name__ : schema for schema in [scoring_output, batch_scoring_output, Audit_Report]}
+
+SAMPLE_OUTPUTS = [
+    ("scoring_output", {"scores" : {"accuracy" : 4, "completeness" : 3, "grounding" : 4, "reasoning" : 4, "clarity" : 5},
+                        "confidence_estimate" : 0.8, "justification" : "Accurate and grounded in snippets 1 and 3, but misses the notice period."}),
+    ("Audit_Report", {"audit_id" : "a_1", "flags" : [{"scorer_id" : "gpt-4.1-nano", "issue" : "Extreme scorer", "severity" : "low"}],
+                      "drops" : [], "explanation" : "One scorer is consistently generous.", "normalization" : {"gpt-4.1-nano" : 0.9}}),
+]
+
+
+###############################################################################
+# Name : legacy_parse
+# Function : The parse path judges used before the tolerant parser
+# Returns : dict
+###############################################################################
+def legacy_parse(text):
+    cleaned = re.sub(r'//.*', '', extract_first_curly_balanced(text)).replace('null', '0')
+    return ast.literal_eval("{" + cleaned + "}")
+
+###############################################################################
+# Name : malformed_variants
+# Function : The ways LLM outputs around a valid JSON object usually go wrong
+# Returns : list of (variant name, text)
+###############################################################################
+def malformed_variants(data):
+    text = json.dumps(data, indent=2)
+    variants = [
+        ("valid", text),
+        ("prose", "Here is my evaluation:\n" + text + "\nLet me know if you need more."),
+        ("fence", "```json\n" + text + "\n```"),
+        ("comments", re.sub(r",\n", ", // note\n", text, count=2)),
+        ("trailing_comma", re.sub(r"\n(\s*)([}\]])", r",\n\1\2", text, count=1)),
+        ("single_quotes", text.replace("'", "").replace('"', "'")),
+        ("python_literals", text.replace("true", "True").replace("null", "None")),
+    ]
+    # Cut off in the last 10%, where length limits usually hit
+    for fraction in [0.9, 0.95, 0.99]:
+        variants.append((f"truncated_{int(fraction * 100)}", text[:int(len(text) * fraction)]))
+    return variants
+
+def load_corpus(path):
+    corpus = []
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                corpus.append((entry["schema"], "recorded", entry["output"]))
+    return corpus
+
+def timed(parse, text, schema):
+    started = time.perf_counter()
+    try:
+        result = parse(text)
+        schema.model_validate(result)
+        ok = True
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse success rate and time of judge outputs")
+    parser.add_argument("--corpus", default=JUDGE_OUTPUT_LOG, help="JSONL of recorded outputs (see JUDGE_OUTPUT_LOG)")
+    parser.add_argument("--repeat", type=int, default=20, help="timing repetitions per output")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    parsed = []
+    for schema_name, _, text in corpus:
+        try:
+            parsed.append((schema_name, parse_output(text, SCHEMAS[schema_name])))
+        except ValueError:
+            pass
+    for schema_name, data in parsed + SAMPLE_OUTPUTS:
+        corpus += [(schema_name, variant, text) for variant, text in malformed_variants(data)]
+    print(f"{len(corpus)} outputs ({sum(1 for c in corpus if c[1] == 'recorded')} recorded)")
+
+    results = {}
+    for schema_name, variant, text in corpus:
+        schema = SCHEMAS[schema_name]
+        for name, parse in [("legacy", legacy_parse), ("tolerant", lambda t, s=schema: parse_output(t, s))]:
+            runs = [timed(parse, text, schema) for _ in range(args.repeat)]
+            row = results.setdefault((variant, name), {"ok" : 0, "n" : 0, "seconds" : []})
+            row["ok"] += runs[0][0]
+            row["n"] += 1
+            row["seconds"] += [seconds for _, seconds in runs]
+
+    print(f"{'variant':<18}{'parser':<10}{'success':>9}{'p50 us':>9}{'p99 us':>9}")
+    for (variant, name), row in results.items():
+        print(f"{variant:<18}{name:<10}{row['ok'] / row['n']:>9.0%}{1e6 * np.percentile(row['seconds'], 50):>9.1f}"
+              f"{1e6 * np.percentile(row['seconds'], 99):>9.1f}")
+    for name in ["legacy", "tolerant"]:
+        rows = [row for (_, n), row in results.items() if n == name]
+        print(f"{'all':<18}{name:<10}{sum(r['ok'] for r in rows) / sum(r['n'] for r in rows):>9.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import time, hashlib, re, threading
+from collections import OrderedDict
+import numpy as np
+from ai_council.constants import *
+from ai_council.vector import vector_db_fingerprint
+from ai_council.tracing import log
+
+
+class CouncilCache:
+    """
+    LRU + TTL cache of whole council runs, put in front of run_council.
+    Entries are keyed by the normalized question plus a hash of the set of retrieved chunks, so an
+    answer is only reused when it would be grounded on the same chunks. When embeddings are
+    given, a question that misses exactly can still hit an entry whose question embedding has a
+    cosine similarity of at least similarity_threshold and whose chunks overlap the retrieved ones
+    by at least context_overlap (Jaccard): paraphrases retrieve the same chunks in another order,
+    or with one swapped.
+    The whole cache is dropped when the vector db on disk changes.
+    """
+    def __init__(self, embeddings=None, max_entries=COUNCIL_CACHE_SIZE, ttl_seconds=COUNCIL_CACHE_TTL,
+                 similarity_threshold=COUNCIL_CACHE_SIMILARITY, context_overlap=COUNCIL_CACHE_OVERLAP):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.context_overlap = context_overlap
+        self.entries = OrderedDict()    # (question, context hash) -> {"vector", "chunks", "result", "created"}
+        self.pending_vectors = {}       # question embeddings from missed lookups, reused by aput
+        self.fingerprint = vector_db_fingerprint()
+        self.lock = threading.Lock()
+        self.stats = {"hits" : 0, "near_hits" : 0, "misses" : 0}
+
+    @staticmethod
+    def normalize(question):
+        """Lowercases, collapses whitespace and drops trailing punctuation."""
+        return re.sub(r"\s+", " ", question).strip().lower().rstrip("?.! ")
+
+    @staticmethod
+    def chunk_hashes(context):
+        """Hashes each retrieved chunk (text and metadata); returns them as a set."""
+        return frozenset(hashlib.sha256(doc.page_content.encode() + repr(sorted(doc.metadata.items())).encode()).hexdigest()
+                         for doc in context)
+
+    @classmethod
+    def context_hash(cls, context):
+        """Hashes the set of retrieved chunks, whatever order they were retrieved in."""
+        return hashlib.sha256("".join(sorted(cls.chunk_hashes(context))).encode()).hexdigest()
+
+    @staticmethod
+    def overlap(chunks, other):
+        """Jaccard overlap of two sets of chunk hashes."""
+        return len(chunks & other) / len(chunks | other) if chunks or other else 1.0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.pending_vectors.clear()
+
+    def _refresh(self, now):
+        """Drops everything after a vector db rebuild and expired entries otherwise. Holds the lock."""
+        fingerprint = vector_db_fingerprint()
+        if fingerprint != self.fingerprint:
+            log("Vector DB changed, clearing the council cache")
+            self.entries.clear()
+            self.pending_vectors.clear()
+            self.fingerprint = fingerprint
+        for key in [k for k, e in self.entries.items() if now - e["created"] > self.ttl_seconds]:
+            del self.entries[key]
+
+    async def _embed(self, question):
+        vector = np.asarray(await self.embeddings.aembed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def aget(self, question, context):
+        """
+        Returns the cached run for this question and context, or None.
+        """
+        key = (self.normalize(question), self.context_hash(context))
+        with self.lock:
+            self._refresh(time.time())
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.entries[key]["result"]
+        if self.embeddings is None or self.similarity_threshold is None:
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+
+        vector = await self._embed(key[0])
+        chunks = self.chunk_hashes(context)
+        with self.lock:
+            candidates = [(k, e) for k, e in self.entries.items()
+                          if e["vector"] is not None and self.overlap(chunks, e["chunks"]) >= self.context_overlap]
+            if candidates:
+                similarities = np.stack([e["vector"] for _, e in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self.entries.move_to_end(candidates[best][0])
+                    self.stats["near_hits"] += 1
+                    return candidates[best][1]["result"]
+            if len(self.pending_vectors) >= self.max_entries:
+                self.pending_vectors.clear()
+            self.pending_vectors[key] = vector
+            self.stats["misses"] += 1
+        return None
+
+    async def aput(self, question, context, result):
+        """
+        Stores a finished run, evicting the least recently used entries beyond max_entries.
+        """
+        key = (self.normalize(question), self.context_hash(context))
+        with self.lock:
+            vector = self.pending_vectors.pop(key, None)
+        if vector is None and self.embeddings is not None and self.similarity_threshold is not None:
+            vector = await self._embed(key[0])
+        with self.lock:
+            self._refresh(time.time())
+            self.entries[key] = {"vector" : vector, "chunks" : self.chunk_hashes(context), "result" : result, "created" : time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
@@ -1,6 +1,5 @@
-from langchain_ollama import OllamaLLM
-from langchain_openai import ChatOpenAI
 import os
+from ai_council.models import LazyModel
 
 
 
@@ -16,28 +15,34 @@ import os
 
 IS_ONLINE = False
 
+# Model configuration only: each client is built on first use of model["llm"] (see models.py)
 ONLINE_MODLES =[
-    {"id" : "expert_1", "llm" : ChatOpenAI(model="gpt-4.1-nano"), "name" : "gpt-4.1-nano"},
-    {"id" : "expert_2", "llm" : ChatOpenAI(model="gpt-4o-mini"), "name" : "gpt-4o-mini"},
-    {"id" : "expert_3", "llm" : ChatOpenAI(model="gpt-4.1-mini"), "name" : "gpt-4.1-mini"},
-    # {"id" : "expert_4", "llm" : ChatOpenAI(model="mistral:7b"), "name" : "mistral:7b"},
-    # {"id" : "expert_5", "llm" : ChatOpenAI(model="phi3:mini"), "name" : "phi3:mini"},      ### Makes mistakes and brings for variance
-    {"id" : "evaluator", "llm" : ChatOpenAI(model="gpt-5-mini"), "name": "gpt-5-mini"},
-    # {"id" : "expert_6", "llm" : ChatOpenAI(model="gpt-oss:20b"), "name" : "gpt-oss:20b"}
+    LazyModel(id="expert_1", name="gpt-4.1-nano", backend="openai"),
+    LazyModel(id="expert_2", name="gpt-4o-mini", backend="openai"),
+    LazyModel(id="expert_3", name="gpt-4.1-mini", backend="openai"),
+    # LazyModel(id="expert_4", name="mistral:7b", backend="openai"),
+    # LazyModel(id="expert_5", name="phi3:mini", backend="openai"),      ### Makes mistakes and brings for variance
+    LazyModel(id="evaluator", name="gpt-5-mini", backend="openai"),
+    # LazyModel(id="expert_6", name="gpt-oss:20b", backend="openai")
 ]
 
 OFFLINE_MODELS = [
-    # {"id" : "expert_1", "llm" : OllamaLLM(model="deepseek-r1:8b"), "name" : "deepseek-r1:8b"},
-    {"id" : "expert_2", "llm" : OllamaLLM(model="starling-lm"), "name" : "starling-1m"},
-    {"id" : "expert_3", "llm" : OllamaLLM(model="ministral-3"), "name" : "minstral-3"},
-    {"id" : "expert_4", "llm" : OllamaLLM(model="mistral:7b"), "name" : "mistral:7b"},
-    {"id" : "expert_5", "llm" : OllamaLLM(model="phi3:mini"), "name" : "phi3:mini"},      ### Makes mistakes and brings for variance
-    {"id" : "evaluator", "llm" : OllamaLLM(model="gemma2:9b"), "name": "gemma2:9b"},
-    # {"id" : "expert_6", "llm" : OllamaLLM(model="gpt-oss:20b"), "name" : "gpt-oss:20b"}
+    # LazyModel(id="expert_1", name="deepseek-r1:8b", backend="ollama"),
+    LazyModel(id="expert_2", name="starling-1m", backend="ollama", model="starling-lm"),
+    LazyModel(id="expert_3", name="minstral-3", backend="ollama", model="ministral-3"),
+    LazyModel(id="expert_4", name="mistral:7b", backend="ollama"),
+    LazyModel(id="expert_5", name="phi3:mini", backend="ollama"),      ### Makes mistakes and brings for variance
+    LazyModel(id="evaluator", name="gemma2:9b", backend="ollama"),
+    # LazyModel(id="expert_6", name="gpt-oss:20b", backend="ollama")
 ]
 
 MODELS = ONLINE_MODLES if IS_ONLINE else OFFLINE_MODELS
 
+FAKE_MODELS = os.environ.get("AI_COUNCIL_FAKE_MODELS") == "1"  # deterministic local stand-ins (fake_llm), no network or Ollama needed
+if FAKE_MODELS:
+    from ai_council.fake_llm import fake_models
+    MODELS = fake_models()
+
 WEIGHTS = {
     'accuracy' : 0.35,
     'completeness' : 0.25,
@@ -46,5 +51,91 @@ WEIGHTS = {
     'clarity' : 0.05
 }
 
+EXPERT_TIMEOUT = 600            # seconds an expert may take before it is left out of the council
+SCORING_TIMEOUT = 600           # seconds a judge may take on one response
+AUDIT_TIMEOUT = 600             # seconds the evaluator may take on the audit before the council is aggregated without it
+BATCHED_SCORING = False         # score all responses in one call per judge instead of one call per cell
+ADAPTIVE_SCORING = False        # ask judges in rounds and stop once the best response on the raw (pre-audit) scores is decided
+ADAPTIVE_MIN_JUDGES = 2         # judges in the first adaptive round
+ADAPTIVE_MARGIN = None          # e.g. 0.25: also stop once the leader's average leads by this fraction of the total range; None = exact only
+SCORE_RANGE = (1, 5)            # rubric score range, bounds every weighted total
+
+CASCADE = False                 # answer with one fast expert and one judge first, escalate to the full council when unsure
+CASCADE_EXPERT = "fake-expert-1" if FAKE_MODELS else "gpt-4.1-nano" if IS_ONLINE else "phi3:mini"   # MODELS name of the first-tier expert
+CASCADE_JUDGE = "fake-expert-2" if FAKE_MODELS else "gpt-4o-mini" if IS_ONLINE else "mistral:7b"    # MODELS name of the first-tier judge
+CASCADE_MIN_SCORE = 4.0         # weighted mean rubric score (1-5) the first-tier answer needs
+CASCADE_MIN_CONFIDENCE = 0.7    # judge confidence_estimate the first-tier answer needs
+REPAIR_RETRIES = 1              # cheap re-asks with just the broken output when a judge reply does not validate
+JUDGE_OUTPUT_LOG = None         # JSONL file recording raw judge and auditor outputs (corpus for benchmark_parsing)
+TRACE_BUFFER = 10000            # finished spans kept in memory (tracing.finished_spans)
+TRACE_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]   # span latency histogram bounds, seconds
+
+# In-flight calls allowed per model, by backend. Local Ollama models serve one request at a
+# time well; OpenAI is rate limited per account rather than per call. A model entry may
+# override this with its own "max_concurrency" key.
+CONCURRENCY_LIMITS = {
+    'ollama' : 1,
+    'openai' : 8
+}
+
+WARM_UP_MODELS = True           # preload every model at start-up so the first question runs at steady-state latency
+MODEL_KEEP_ALIVE = "30m"        # how long Ollama keeps a model loaded after its last call
+WARM_UP_TIMEOUT = 300           # seconds one model may take to warm up before it is skipped
+# Connection pool shared by all clients of one host (see models.http_pool)
+HTTP_POOL_LIMITS = {
+    'max_connections' : 32,
+    'max_keepalive_connections' : 16,
+    'keepalive_expiry' : 300    # seconds an idle connection is kept open
+}
+
+UI_LOG_RETENTION = 2000         # log entries the notebook UI keeps; older ones are dropped
+UI_FRAME_RATE = 10              # most chat and log panel re-renders per second; updates in between are coalesced
+UI_LOG_WINDOW = 200             # log entries rendered at once; each frame re-sends the whole log panel
+UI_CHAT_WINDOW = 50             # chat messages rendered at once; "Show earlier messages" renders more
+
+COUNCIL_CACHE_SIZE = 256        # council runs kept in the result cache
+COUNCIL_CACHE_TTL = 3600        # seconds a cached run stays valid
+COUNCIL_CACHE_SIMILARITY = 0.95 # cosine similarity above which a question counts as a near-duplicate (None to disable)
+COUNCIL_CACHE_OVERLAP = 0.7     # share of retrieved chunks (Jaccard) a near-duplicate must have in common with the cached run
+
+INGEST_WORKERS = None           # processes extracting PDF pages (None = one per core)
+INGEST_PAGES_PER_TASK = 32      # PDF pages per extraction task
+
+# Chunks per embedding request and embedding requests in flight, by backend
+EMBEDDING_BATCHING = {
+    'ollama' : {'batch_size' : 64, 'concurrency' : 2},
+    'openai' : {'batch_size' : 256, 'concurrency' : 4}
+}
+EMBED_RETRIES = 3               # attempts per embedding batch before the build fails
+EMBED_REPORT_SECONDS = 5        # seconds between ingestion progress reports
+
+# FAISS index built by create_vector_db: "flat", "ivf_flat", "hnsw" or "ivf_pq".
+# nprobe and ef_search are query-time settings; changing any other key rebuilds the index.
+VECTOR_INDEX = {
+    'type' : 'flat',
+    'nlist' : 256,              # IVF cells (reduced automatically for small corpora)
+    'nprobe' : 16,              # IVF cells searched per query
+    'hnsw_m' : 32,              # HNSW neighbours per node
+    'ef_construction' : 200,
+    'ef_search' : 64,           # HNSW candidates kept per query
+    'pq_m' : 16,                # PQ sub-quantizers, must divide the embedding dimension
+    'pq_bits' : 8
+}
+
+HYBRID_RETRIEVAL = True         # fuse BM25 and vector results for the council context
+HYBRID_FETCH_K = 20             # candidates taken from each retriever before fusion
+RRF_K = 60                      # reciprocal rank fusion constant
+CONTEXT_CANDIDATES = 6          # chunks retrieved before packing; a few more than fit, so MMR has a choice
+CONTEXT_TOKEN_BUDGET = 700      # tokens of context sent to every expert, below the 4 raw chunks (~800) sent before packing
+CONTEXT_CHARS_PER_TOKEN = 4     # token estimate; the local models use their own tokenizers
+CONTEXT_MMR_LAMBDA = 0.7        # 1 = relevance only, 0 = diversity only
+CONTEXT_DUPLICATE_SIMILARITY = 0.95   # chunks this close to one already packed are dropped
+
 DATA_DOC_FOLDER = "ai_council/Docs"
-VECTOR_DB_FOLDER = "ai_council/Vectors/Local" if not IS_ONLINE else "ai_council/Vectors/Online"
\ No newline at end of file
+# Fake mode has its own folder: its index is built with the fake embeddings, not the real model
+VECTOR_DB_FOLDER = "ai_council/Vectors/Fake" if FAKE_MODELS else "ai_council/Vectors/Local" if not IS_ONLINE else "ai_council/Vectors/Online"
+VECTOR_MANIFEST_PATH = VECTOR_DB_FOLDER + "/manifest.json"
+VECTOR_INDEX_PATH = VECTOR_DB_FOLDER + "/index.faiss"
+VECTOR_DOCSTORE_PATH = VECTOR_DB_FOLDER + "/docstore.sqlite"
+VECTOR_DB_FORMAT = 3            # bumped when the on-disk layout changes; older dbs are rebuilt
+EMBEDDING_CACHE_PATH = "ai_council/Vectors/embedding_cache.sqlite"
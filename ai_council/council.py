@@ -1,13 +1,19 @@
-import time, json, statistics, ast, re
+import time, json, statistics, re, contextlib
 import numpy as np
 # from ai_council.generate_prompts import *
 from ai_council.prompts import *
 from ai_council.constants import *
-from langchain_ollama import OllamaLLM
+from ai_council.retrieval import ahybrid_search, apack_context
+from ai_council.parsing import output_text, parse_output, describe_error
+from ai_council.scoring import ScoringTensor
+from ai_council.models import awarm_up
+from ai_council.tracing import span, log, token_counts
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 
 scoring_results = []
+parse_stats = {"parsed" : 0, "repaired" : 0, "failed" : 0}      # judge and auditor outputs, see aparse_with_repair
+cascade_stats = {"cascade" : {"answered" : 0, "seconds" : 0.0}, "council" : {"answered" : 0, "seconds" : 0.0}}
 
 def extract_first_curly_balanced(text):
     """
@@ -89,108 +95,749 @@ def pretty_print_json(json_data):
 
 
 
-import ast
 import re
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import asyncio
+import threading
+import weakref
 
-def generate_scores(responses, user_prompt, llm=None, timeout_seconds=600, max_workers=4):
+_model_slots = weakref.WeakKeyDictionary()     # event loop -> {model name: asyncio.Semaphore}
+_council_loop = None
+_council_loop_lock = threading.Lock()
+
+def model_backend(model):
     """
-    Score candidate responses using multiple LLM chains with a timeout on each invoke.
-    - timeout_seconds: how long to wait for chain.invoke before skipping that response.
-    - max_workers: threadpool size for wrapping blocking invoke() calls.
+    Returns the backend name of a MODELS entry ("ollama", "openai", ...).
+    Read from the entry's configuration, so looking it up never builds the client.
     """
-    scorer_parser = PydanticOutputParser(pydantic_object=scoring_output)
-    scoring_prompt = ChatPromptTemplate.from_template(scoring_template)
-    chains = [(scoring_prompt | k["llm"], k) for k in MODELS]
+    return model.get("backend", "ollama")
 
-    scoring_matrix = {}
+def model_slot(model):
+    """
+    Returns the semaphore that caps in-flight calls to one model on the running event loop.
+    Shared across stages and questions, so a local model is never oversubscribed.
+    """
+    slots = _model_slots.setdefault(asyncio.get_running_loop(), {})
+    if model["name"] not in slots:
+        limit = model.get("max_concurrency", CONCURRENCY_LIMITS.get(model_backend(model), 1))
+        slots[model["name"]] = asyncio.Semaphore(limit)
+    return slots[model["name"]]
 
-    # Reuse a threadpool to wrap blocking invoke() calls
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for chain in chains:
-            # skip evaluator and optionally filter by llm name
-            if chain[1]["id"] == "evaluator":
-                continue
-            if llm and chain[1]["name"] != llm:
-                continue
-
-            temp_dict = {}
-            print(chain[1]["name"])
-
-            for i in range(len(responses)):
-                payload = {
-                    "user_prompt": user_prompt,
-                    "candidate_response": responses[i],
-                    "output_format": scorer_parser.get_format_instructions()
-                }
+async def astream_chain(chain, payload, on_token):
+    """
+    Streams chain, passing each chunk's text to on_token, and returns the whole output as
+    chain.ainvoke would (chunks of a chat model add up to one message).
+    """
+    result = None
+    async for chunk in chain.astream(payload):
+        result = chunk if result is None else result + chunk
+        on_token(output_text(chunk))
+    return "" if result is None else result
 
-                # submit the blocking invoke() to the threadpool and wait with timeout
-                future = executor.submit(chain[0].invoke, payload)
-                try:
-                    result = future.result(timeout=timeout_seconds)
-                except FuturesTimeoutError:
-                    # timed out — continue the loop
-                    print(f"Timeout after {timeout_seconds}s for {responses[i]['response_id']} by {chain[1]['name']}")
-                    # Optionally: future.cancel()  # best-effort (may not have effect if already running)
-                    continue
-                except Exception as e:
-                    # other errors from invoke()
-                    print(f"Invoke error for {responses[i]['response_id']} by {chain[1]['name']}: {e}")
-                    continue
+async def ainvoke_model(chain, payload, model, timeout_seconds=None, stage="llm", on_token=None):
+    """
+    Invokes chain for one model while holding its slot.
+    The timeout (overridable by the model's own "timeout" key) counts from when the slot is
+    acquired, so time spent queueing behind other calls to the same model does not count.
+    Each call is an "llm_call" span covering the call itself, with the time spent queueing
+    for the slot, the token counts and the stage ("expert", "judge", "audit", "repair", ...).
+    - on_token: if set, the output is streamed and on_token gets the text of every chunk.
+    """
+    queued = time.perf_counter()
+    async with model_slot(model):
+        with span("llm_call", model=model["name"], stage=stage, queue_seconds=time.perf_counter() - queued) as s:
+            call = chain.ainvoke(payload) if on_token is None else astream_chain(chain, payload, on_token)
+            result = await asyncio.wait_for(call, timeout=model.get("timeout", timeout_seconds))
+            tokens_in, tokens_out = token_counts(result, lambda: chain.first.invoke(payload) if hasattr(chain, "first") else payload)
+            s.set(tokens_in=tokens_in, tokens_out=tokens_out)
+            return result
+
+async def awarm_up_models(models=None, timeout_seconds=WARM_UP_TIMEOUT):
+    """
+    Preloads the council's models (see models.awarm_up) before the first question.
+    Ollama models load one at a time, since loads compete for the same GPU; OpenAI ones at once.
+    A model that fails or takes over timeout_seconds is logged and left to load on its first question.
+    Returns {model name: seconds, or None if it was skipped}.
+    """
+    models = MODELS if models is None else models
+    timings = {}
 
-                # Parsing and weighting (kept your original logic, with minor safety)
+    async def warm(model):
+        started = time.perf_counter()
+        async with model_slot(model):
+            with span("warm_up", model=model["name"]) as s:
                 try:
-                    scoring_results.append(result)
-                    if not IS_ONLINE:
-                        raw = extract_first_curly_balanced(scoring_results[-1])
-                        cleaned = re.sub(r'//.*', '', raw).replace('null', '0')
-                        json_response = ast.literal_eval("{" + cleaned + "}")
-                    else:
-                        json_response = ast.literal_eval(scoring_results[0].content)
-                    json_response["total"] = sum(WEIGHTS[k] * json_response["scores"][k] for k in WEIGHTS)
-                    temp_dict[responses[i]["response_id"]] = json_response
-                    print(f"Scoring complete for {responses[i]['response_id']} by {chain[1]['name']}")
+                    await asyncio.wait_for(awarm_up(model), timeout=timeout_seconds)
+                    timings[model["name"]] = time.perf_counter() - started
+                except asyncio.TimeoutError:
+                    s.outcome = "timeout"
+                    timings[model["name"]] = None
+                    log(f"Warm-up of {model['name']} took over {timeout_seconds}s, skipping it", "WARNING")
                 except Exception as e:
-                    print(f"Could not parse {responses[i]['response_id']} by {chain[1]['name']} due to {e}")
+                    s.outcome = "error"
+                    timings[model["name"]] = None
+                    log(f"Could not warm up {model['name']}: {type(e).__name__} {e}", "WARNING")
+
+    async def warm_in_turn(local):
+        for model in local:
+            await warm(model)
+
+    with span("warm_up_models"):
+        await asyncio.gather(warm_in_turn([m for m in models if model_backend(m) == "ollama"]),
+                             *(warm(m) for m in models if model_backend(m) != "ollama"))
+    return timings
+
+def warm_up_models(models=None, timeout_seconds=WARM_UP_TIMEOUT):
+    return run_sync(awarm_up_models(models, timeout_seconds))
+
+def council_loop():
+    """
+    Returns the background event loop that the sync wrappers and the UI run council coroutines on.
+    One shared loop means the per-model caps hold for every caller in the process.
+    """
+    global _council_loop
+    with _council_loop_lock:
+        if _council_loop is None:
+            _council_loop = asyncio.new_event_loop()
+            threading.Thread(target=_council_loop.run_forever, name="ai-council-loop", daemon=True).start()
+        return _council_loop
+
+def run_sync(coro):
+    """
+    Runs a council coroutine to completion from synchronous code (threads, notebooks).
+    """
+    loop = council_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync cannot be called from the council loop, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+def record_output(result, schema):
+    """
+    Keeps a raw judge or auditor output in scoring_results and, if JUDGE_OUTPUT_LOG is set, in the parsing corpus.
+    """
+    scoring_results.append(result)
+    if JUDGE_OUTPUT_LOG:
+        with open(JUDGE_OUTPUT_LOG, "a") as f:
+            f.write(json.dumps({"schema" : schema.__name__, "output" : output_text(result)}) + "\n")
 
-            scoring_matrix[chain[1]["name"]] = temp_dict
+async def aparse_with_repair(result, schema, model, timeout_seconds=SCORING_TIMEOUT, retries=REPAIR_RETRIES):
+    """
+    Parses and validates an LLM output against schema.
+    If it does not fit but contains a JSON object, the same model is re-asked with only its
+    previous output and the problems found, which is far cheaper than repeating the original call.
+    Raises ValueError when the output still does not fit after the retries.
+    """
+    repair_parser = PydanticOutputParser(pydantic_object=schema)
+    repair_prompt = ChatPromptTemplate.from_template(repair_template)
+    record_output(result, schema)
+    for attempt in range(retries + 1):
+        try:
+            with span("parse", model=model["name"], schema=schema.__name__, attempt=attempt):
+                parsed = parse_output(result, schema)
+            parse_stats["repaired" if attempt else "parsed"] += 1
+            return parsed
+        except ValueError as e:
+            text = output_text(result)
+            if attempt == retries or "{" not in text:
+                parse_stats["failed"] += 1
+                raise
+            log(f"Re-asking {model['name']} to repair its output: {describe_error(e, 200)}", "WARNING")
+            result = await ainvoke_model(repair_prompt | model["llm"], {
+                "previous_output" : text,
+                "errors" : describe_error(e),
+                "output_format" : repair_parser.get_format_instructions()
+            }, model, timeout_seconds, stage="repair")
+            record_output(result, schema)
+
+def score_total(json_response):
+    """
+    Adds the WEIGHTS-weighted "total" to a parsed score.
+    """
+    json_response["total"] = sum(WEIGHTS[k] * json_response["scores"][k] for k in WEIGHTS)
+    return json_response
 
+async def ascore_response(judges, response, user_prompt, cells, timeout_seconds=SCORING_TIMEOUT):
+    """
+    Scores one response with every judge concurrently.
+    Parsed scores are written to cells[(judge_name, response_id)]; failed cells are logged and skipped.
+    Judges that already have a cell for this response (e.g. from the cascade tier) are not asked again.
+    """
+    scorer_parser = PydanticOutputParser(pydantic_object=scoring_output)
+    scoring_prompt = ChatPromptTemplate.from_template(scoring_template)
+    payload = {
+        "user_prompt": user_prompt,
+        "candidate_response": response,
+        "output_format": scorer_parser.get_format_instructions()
+    }
+    response_id = response["response_id"]
+    judges = [judge for judge in judges if (judge["name"], response_id) not in cells]
+
+    async def score(judge):
+        with span("judge_cell", model=judge["name"], response_id=response_id) as s:
+            try:
+                result = await ainvoke_model(scoring_prompt | judge["llm"], payload, judge, timeout_seconds, stage="judge")
+            except asyncio.TimeoutError:
+                s.outcome = "timeout"
+                log(f"Timeout after {judge.get('timeout', timeout_seconds)}s for {response_id} by {judge['name']}", "WARNING")
+                return
+            except Exception as e:
+                s.outcome = "error"
+                log(f"Invoke error for {response_id} by {judge['name']}: {e}", "ERROR")
+                return
+            try:
+                cells[(judge["name"], response_id)] = score_total(await aparse_with_repair(result, scoring_output, judge, timeout_seconds))
+                log(f"Scoring complete for {response_id} by {judge['name']}")
+            except Exception as e:
+                s.outcome = "parse_error"
+                log(f"Could not parse {response_id} by {judge['name']} due to {e}", "WARNING")
+
+    await asyncio.gather(*(score(judge) for judge in judges))
+
+def layout_scoring_matrix(judges, responses, cells):
+    """
+    Cells complete in any order; lay the matrix out in MODELS x responses order.
+    """
+    scoring_matrix = {}
+    for judge in judges:
+        scoring_matrix[judge["name"]] = {r["response_id"]: cells[(judge["name"], r["response_id"])]
+                                         for r in responses if (judge["name"], r["response_id"]) in cells}
     return scoring_matrix
 
+async def ascore_batch(judge, responses, user_prompt, cells, timeout_seconds=SCORING_TIMEOUT):
+    """
+    Scores all responses with a single call to one judge, which returns a list of scores keyed
+    by response_id. Each entry is validated on its own: an entry that does not fit is re-asked
+    alone (see aparse_with_repair), and responses missing from the reply or whose entry still
+    does not fit are then scored one call each, as in ascore_response.
+    Responses this judge already has a cell for are left out of the batch.
+    """
+    responses = [r for r in responses if (judge["name"], r["response_id"]) not in cells]
+    if not responses:
+        return
+    batch_parser = PydanticOutputParser(pydantic_object=batch_scoring_output)
+    batch_prompt = ChatPromptTemplate.from_template(batch_scoring_template)
+    payload = {
+        "user_prompt": user_prompt,
+        "candidate_responses": responses,
+        "output_format": batch_parser.get_format_instructions()
+    }
+    with span("judge_batch", model=judge["name"], responses=len(responses)) as s:
+        try:
+            result = await ainvoke_model(batch_prompt | judge["llm"], payload, judge, timeout_seconds, stage="batch_judge")
+            record_output(result, batch_scoring_output)
+            data = parse_output(result)
+            entries = data.get("results", []) if isinstance(data, dict) else data
+            if not isinstance(entries, list):
+                raise ValueError("No list of results in the batch reply")
+        except asyncio.TimeoutError:
+            s.outcome = "timeout"
+            log(f"Timeout after {judge.get('timeout', timeout_seconds)}s for the batch by {judge['name']}", "WARNING")
+            entries = []
+        except Exception as e:
+            s.outcome = "parse_error" if isinstance(e, ValueError) else "error"
+            log(f"Could not score the batch by {judge['name']} due to {e}", "WARNING")
+            entries = []
+
+    response_ids = {r["response_id"] for r in responses}
+
+    async def score_entry(entry):
+        if not isinstance(entry, dict) or entry.get("response_id") not in response_ids:
+            return
+        response_id = entry["response_id"]
+        try:
+            parsed = keyed_scoring_output.model_validate(entry).model_dump()
+            parse_stats["parsed"] += 1
+        except ValueError:
+            try:
+                parsed = await aparse_with_repair(json.dumps(entry), keyed_scoring_output, judge, timeout_seconds)
+            except Exception as e:
+                log(f"Could not parse the batch entry for {response_id} by {judge['name']} due to {describe_error(e, 200)}", "WARNING")
+                return
+        parsed.pop("response_id")
+        cells[(judge["name"], response_id)] = score_total(parsed)
+
+    await asyncio.gather(*(score_entry(entry) for entry in entries))
+
+    retry = [r for r in responses if (judge["name"], r["response_id"]) not in cells]
+    log(f"Batch scoring complete by {judge['name']}, {len(responses) - len(retry)}/{len(responses)} parsed")
+    await asyncio.gather(*(ascore_response([judge], r, user_prompt, cells, timeout_seconds) for r in retry))
+
+def total_bounds(weights=WEIGHTS, score_range=SCORE_RANGE):
+    """
+    Lowest and highest weighted total a judge can give.
+    """
+    return score_range[0] * sum(weights.values()), score_range[1] * sum(weights.values())
+
+def adaptive_contenders(judges, responses, cells, remaining, margin=ADAPTIVE_MARGIN):
+    """
+    Returns the responses that can still end with the best average total.
+    Each response's final average is bounded by its current totals plus the lowest or highest
+    total from each of the remaining judges; a response whose upper bound is below the leader's
+    lower bound can never win. With margin, the leader alone is returned once its current
+    average beats every other response's by margin times the total range.
+    """
+    lo, hi = total_bounds()
+    totals = np.array([[cells[(j["name"], r["response_id"])]["total"] if (j["name"], r["response_id"]) in cells else np.nan
+                        for j in judges] for r in responses]).reshape(len(responses), len(judges))
+    counts = (~np.isnan(totals)).sum(axis=1)
+    sums = np.nansum(totals, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lower = np.where(counts + remaining > 0, (sums + remaining * lo) / (counts + remaining), -np.inf)
+        upper = np.where(counts + remaining > 0, (sums + remaining * hi) / (counts + remaining), -np.inf)
+        # Responses nobody has scored yet could still average anything up to their upper bound
+        means = np.where(counts > 0, sums / counts, upper)
+    if margin and len(responses) > 1 and counts.any():
+        leader = int(np.argmax(np.where(counts > 0, means, -np.inf)))
+        if means[leader] - np.delete(means, leader).max() >= margin * (hi - lo):
+            return [responses[leader]]
+    return [r for r, u in zip(responses, upper) if u > -np.inf and u >= lower.max()]
+
+async def ascore_adaptive(judges, responses, user_prompt, cells, timeout_seconds=SCORING_TIMEOUT,
+                          min_judges=ADAPTIVE_MIN_JUDGES, margin=ADAPTIVE_MARGIN):
+    """
+    Scores in rounds, first with min_judges judges and then one judge at a time, asking each
+    round only about responses that can still win (see adaptive_contenders). Stops once a
+    single contender is left. With margin=None that is the response full judging ranks best on the
+    raw scores; the auditor then sees only the cells that were asked, and its normalization and
+    drops can still change the final pick, so the audited winner may differ from full judging.
+    """
+    rounds = [judges[:min_judges]] + [[judge] for judge in judges[min_judges:]]
+    contenders = list(responses)
+    asked, calls = 0, 0
+    for round_judges in rounds:
+        await asyncio.gather(*(ascore_response(round_judges, r, user_prompt, cells, timeout_seconds) for r in contenders))
+        calls += len(round_judges) * len(contenders)
+        asked += len(round_judges)
+        contenders = adaptive_contenders(judges[:asked], contenders, cells, len(judges) - asked, margin)
+        if len(contenders) <= 1:
+            break
+    log(f"Adaptive judging stopped after {asked}/{len(judges)} judges, {calls}/{len(judges) * len(responses)} scoring calls")
+
+async def agenerate_scores(responses, user_prompt, llm=None, timeout_seconds=SCORING_TIMEOUT, batched=BATCHED_SCORING,
+                           adaptive=ADAPTIVE_SCORING, known_cells=None):
+    """
+    Score candidate responses with every judge in MODELS.
+    The whole judge x response grid runs at once; in-flight calls per judge are capped by
+    CONCURRENCY_LIMITS for its backend.
+    - llm: only score with the judge of this name.
+    - timeout_seconds: per-call budget, counted from when the call starts. Cells that run over are skipped.
+    - batched: one call per judge for all responses (see ascore_batch) instead of one call per cell.
+    - adaptive: ask judges in rounds and stop once the best response on the raw scores is decided (see ascore_adaptive).
+    - known_cells: {(judge name, response_id): score} already scored, e.g. by the cascade tier; those are not asked again.
+    """
+    judges = [k for k in MODELS if k["id"] != "evaluator" and (not llm or k["name"] == llm)]
+    cells = dict(known_cells or {})
+    if adaptive:
+        await ascore_adaptive(judges, responses, user_prompt, cells, timeout_seconds)
+    elif batched:
+        await asyncio.gather(*(ascore_batch(judge, responses, user_prompt, cells, timeout_seconds) for judge in judges))
+    else:
+        await asyncio.gather(*(ascore_response(judges, response, user_prompt, cells, timeout_seconds) for response in responses))
+    return layout_scoring_matrix(judges, responses, cells)
+
+def generate_scores(responses, user_prompt, llm=None, timeout_seconds=SCORING_TIMEOUT, batched=BATCHED_SCORING,
+                    adaptive=ADAPTIVE_SCORING, known_cells=None):
+    """
+    Synchronous wrapper around agenerate_scores.
+    """
+    return run_sync(agenerate_scores(responses, user_prompt, llm, timeout_seconds, batched, adaptive, known_cells))
+
+
+def expert_chains(prompt):
+    """
+    Returns (index, chain, model) for every expert in MODELS. The index is the model's
+    position in MODELS and gives the stable response id "r_<index>".
+    """
+    return [(i, prompt|k['llm'], k) for i, k in enumerate(MODELS) if k['id'] != "evaluator"]
+
+async def agenerate_one(i, chain, model, payload, timeout_seconds=EXPERT_TIMEOUT, stream=None):
+    """
+    Generates the response of one expert, or returns None if it timed out or failed.
+    - stream: a CouncilStream the expert's tokens are streamed to.
+    """
+    on_token = stream.token_listener(f"r_{i}", model) if stream is not None else None
+    try:
+        result = await ainvoke_model(chain, payload, model, timeout_seconds, stage="expert", on_token=on_token)
+    except asyncio.TimeoutError:
+        log(f"Timeout after {model.get('timeout', timeout_seconds)}s for {model['name']}, continuing without it", "WARNING")
+        if stream is not None:
+            stream.failed(f"r_{i}")
+        return None
+    except Exception as e:
+        log(f"Invoke error for {model['name']}: {e}, continuing without it", "ERROR")
+        if stream is not None:
+            stream.failed(f"r_{i}")
+        return None
+    log(f"Response generated by {model['name']} with id r_{i}")
+    return {"response_id" : f"r_{i}", "model_id" : model["id"], "text" : result}
+
+async def agenerate_expert_response(user_prompt, context, timeout_seconds=EXPERT_TIMEOUT, stream=None, known_responses=()):
+    """
+    Generate one candidate response per expert in MODELS, all experts at once.
+    - timeout_seconds: per-expert budget, counted from when that expert starts. A model entry
+      may override it with its own "timeout" key. Experts that run over are left out.
+    - stream: a CouncilStream the experts' tokens are streamed to.
+    - known_responses: responses already generated for this prompt (e.g. by the cascade tier);
+      their experts are not run again.
+    Response ids come from the expert's position in MODELS ("r_<i>"), so they do not depend
+    on which experts finish first or whether they finish at all.
+    """
+    prompt = ChatPromptTemplate.from_template(expert_generation_template)
+    payload = {"user_prompt" : user_prompt, "context" : context}
+    return_prompt = prompt.invoke(payload)
+    known = {r["response_id"] : r for r in known_responses}
 
+    async def generate(i, chain, model):
+        return known.get(f"r_{i}") or await agenerate_one(i, chain, model, payload, timeout_seconds, stream)
 
+    results = await asyncio.gather(*(generate(i, chain, model) for i, chain, model in expert_chains(prompt)))
+    return [r for r in results if r is not None], return_prompt
+
+def generate_expert_response(user_prompt, context, concurrent=True, timeout_seconds=EXPERT_TIMEOUT):
+    """
+    Synchronous wrapper around agenerate_expert_response.
+    - concurrent: set to False to call the experts one after the other, without timeouts.
+    """
+    if concurrent:
+        return run_sync(agenerate_expert_response(user_prompt, context, timeout_seconds))
 
-def generate_expert_response(user_prompt, context):
     prompt = ChatPromptTemplate.from_template(expert_generation_template)
-    return_prompt = prompt.invoke({"user_prompt" : user_prompt, "context" : context})
-    chains = [(prompt|k['llm'] , k) for k in MODELS]
+    payload = {"user_prompt" : user_prompt, "context" : context}
+    return_prompt = prompt.invoke(payload)
     responses = []
-    for i, chain in enumerate(chains):
-        if chain[1]['id'] == "evaluator":
-            continue
-        print(f"Response from {chain[1]['name']}")
-        result = chain[0].invoke({"user_prompt" : user_prompt, "context" : context})
-        responses.append(
-            {
-                "response_id" : f"r_{i}",
-                "model_id" : chain[1]["id"],
-                "text" : result
-            }
-        )
-        print(f"Response generated by {chain[1]['name']} with id r_{i}")
+    for i, chain, model in expert_chains(prompt):
+        log(f"Response from {model['name']}")
+        result = chain.invoke(payload)
+        responses.append({"response_id" : f"r_{i}", "model_id" : model["id"], "text" : result})
+        log(f"Response generated by {model['name']} with id r_{i}")
     return responses, return_prompt
 
-def generate_audit_report(user_prompt, responses, scoring_matrix):
+async def agenerate_pipelined_council(user_prompt, context, timeout_seconds=EXPERT_TIMEOUT, scoring_timeout_seconds=SCORING_TIMEOUT,
+                                      stream=None, known_responses=(), known_cells=None):
+    """
+    Generate and score in one pipeline: each expert response goes to the judges as soon as it is
+    generated, so judging overlaps with the experts that are still running.
+    Returns (responses, prompt, scoring_matrix), i.e. what agenerate_expert_response followed by
+    agenerate_scores would give. Timeouts and concurrency caps behave as in those two functions.
+    - stream: a CouncilStream that gets the experts' tokens and every response's scores as they land.
+    - known_responses, known_cells: responses and {(judge name, response_id): score} cells from an
+      earlier tier (the cascade) for the same prompt; they are reused instead of asked again.
+    """
+    prompt = ChatPromptTemplate.from_template(expert_generation_template)
+    payload = {"user_prompt" : user_prompt, "context" : context}
+    return_prompt = prompt.invoke(payload)
+    judges = [k for k in MODELS if k["id"] != "evaluator"]
+    cells = dict(known_cells or {})
+    known = {r["response_id"] : r for r in known_responses}
+
+    async def expert_then_judges(i, chain, model):
+        response = known.get(f"r_{i}") or await agenerate_one(i, chain, model, payload, timeout_seconds, stream)
+        if response is not None:
+            await ascore_response(judges, response, return_prompt, cells, scoring_timeout_seconds)
+            if stream is not None:
+                stream.rescore(cells)
+        return response
+
+    results = await asyncio.gather(*(expert_then_judges(i, chain, model) for i, chain, model in expert_chains(prompt)))
+    responses = [r for r in results if r is not None]
+    return responses, return_prompt, layout_scoring_matrix(judges, responses, cells)
+
+def generate_pipelined_council(user_prompt, context, timeout_seconds=EXPERT_TIMEOUT, scoring_timeout_seconds=SCORING_TIMEOUT):
+    """
+    Synchronous wrapper around agenerate_pipelined_council.
+    """
+    return run_sync(agenerate_pipelined_council(user_prompt, context, timeout_seconds, scoring_timeout_seconds))
+
+async def agenerate_audit_report(user_prompt, responses, scoring_matrix, timeout_seconds=AUDIT_TIMEOUT):
+    """
+    Asks the evaluator to audit the scoring matrix.
+    Returns (audit JSON, prompt); the audit is None when the evaluator runs over timeout_seconds
+    (which also frees its slot for the other questions), fails (connection or HTTP errors) or its
+    output cannot be parsed even after a re-ask, and the council is then aggregated without
+    normalization or drops.
+    """
     audit_report = PydanticOutputParser(pydantic_object=Audit_Report)
     audit_prompt = ChatPromptTemplate.from_template(auditor_prompt_template)
     auditor =[k for k in MODELS if k["id"] == "evaluator"]
     chain = audit_prompt|auditor[0]['llm']
-    # print(audit_prompt)
-    result = chain.invoke({"user_prompt" : user_prompt, "responses" : responses, "scoring_matrix" : scoring_matrix, "output_format": audit_report.get_format_instructions()})
-    return_result = result if not IS_ONLINE else result.content
-    print(return_result)
+    with span("audit", model=auditor[0]["name"]) as s:
+        try:
+            result = await ainvoke_model(chain, {"user_prompt" : user_prompt, "responses" : responses, "scoring_matrix" : scoring_matrix,
+                                                 "output_format": audit_report.get_format_instructions()}, auditor[0], timeout_seconds, stage="audit")
+        except asyncio.TimeoutError:
+            s.outcome = "timeout"
+            log(f"Timeout after {auditor[0].get('timeout', timeout_seconds)}s for the audit by {auditor[0]['name']}, aggregating without it", "WARNING")
+            return None, audit_prompt
+        except Exception as e:
+            s.outcome = "error"
+            log(f"Invoke error for the audit by {auditor[0]['name']}: {e}, aggregating without it", "ERROR")
+            return None, audit_prompt
+        return_result = result if not IS_ONLINE else result.content
+        log(return_result)
+        try:
+            # Validated here, where the auditor can still be re-asked; audited_scoring_matrix reads the repaired JSON
+            return_result = json.dumps(await aparse_with_repair(result, Audit_Report, auditor[0], timeout_seconds))
+        except asyncio.TimeoutError:
+            s.outcome = "timeout"
+            log(f"Timeout while repairing the audit by {auditor[0]['name']}, aggregating without it", "WARNING")
+            return_result = None
+        except ValueError as e:
+            s.outcome = "parse_error"
+            log(f"Could not parse the audit report due to {describe_error(e, 200)}, aggregating without it", "WARNING")
+            return_result = None
+        except Exception as e:
+            s.outcome = "error"
+            log(f"Error while repairing the audit by {auditor[0]['name']}: {e}, aggregating without it", "ERROR")
+            return_result = None
     return return_result, audit_prompt
 
+def generate_audit_report(user_prompt, responses, scoring_matrix, timeout_seconds=AUDIT_TIMEOUT):
+    """
+    Synchronous wrapper around agenerate_audit_report.
+    """
+    return run_sync(agenerate_audit_report(user_prompt, responses, scoring_matrix, timeout_seconds))
+
+def model_index(name):
+    """
+    Position of the model with this name in MODELS.
+    """
+    for i, model in enumerate(MODELS):
+        if model["name"] == name:
+            return i
+    raise KeyError(f"No model named {name} in MODELS")
+
+async def acascade_answer(user_prompt, context, timeout_seconds=EXPERT_TIMEOUT, scoring_timeout_seconds=SCORING_TIMEOUT,
+                          stream=None):
+    """
+    First cascade tier: one fast expert (CASCADE_EXPERT) answers and one judge (CASCADE_JUDGE) scores it.
+    Returns (response, scoring_matrix, accepted); accepted is True when the weighted mean score reaches
+    CASCADE_MIN_SCORE and the judge's confidence_estimate reaches CASCADE_MIN_CONFIDENCE.
+    - stream: a CouncilStream the expert's tokens are streamed to.
+    """
+    prompt = ChatPromptTemplate.from_template(expert_generation_template)
+    payload = {"user_prompt" : user_prompt, "context" : context}
+    i = model_index(CASCADE_EXPERT)
+    expert, judge = MODELS[i], MODELS[model_index(CASCADE_JUDGE)]
+    response = await agenerate_one(i, prompt | expert["llm"], expert, payload, timeout_seconds, stream)
+    if response is None:
+        return None, {}, False
+    cells = {}
+    await ascore_response([judge], response, prompt.invoke(payload), cells, scoring_timeout_seconds)
+    scoring_matrix = layout_scoring_matrix([judge], [response], cells)
+    cell = cells.get((judge["name"], response["response_id"]))
+    accepted = (cell is not None and cell["total"] / sum(WEIGHTS.values()) >= CASCADE_MIN_SCORE
+                and cell["confidence_estimate"] >= CASCADE_MIN_CONFIDENCE)
+    return response, scoring_matrix, accepted
+
+def cascade_hit_rates():
+    """
+    Share of questions answered by each tier and their mean latency, for tuning the cascade thresholds.
+    """
+    total = sum(tier["answered"] for tier in cascade_stats.values())
+    return {name : {"answered" : tier["answered"],
+                    "hit_rate" : tier["answered"] / total if total else 0.0,
+                    "mean_seconds" : tier["seconds"] / tier["answered"] if tier["answered"] else 0.0}
+            for name, tier in cascade_stats.items()}
+
+class CouncilStream:
+    """
+    Streams one council run to a listener as events, so the UI can show progress and a provisional
+    answer long before the audit. The provisional answer follows the current leader: the first
+    expert to produce tokens until scores arrive, then the response with the best average total so far.
+    Events are dicts with a "type":
+    - "stage": "stage", "status" ("started" or "done") and, when done, "seconds".
+    - "leader": the provisional answer is now this response; "response_id", "model" and its "text" so far.
+    - "token": more "text" of the current leader, "response_id".
+    - "final": the answer after the audit, "response_id", "model", "text", "tier" and "confirmed"
+      (True when it is the provisional answer that was shown).
+    The listener is called on the council loop and must not block. Without one nothing is emitted.
+    """
+    def __init__(self, listener=None):
+        self.listener = listener
+        self.texts = {}         # response_id -> text streamed so far
+        self.models = {}        # response_id -> model name
+        self.leader = None
+        self.scored = False     # once scores exist the leader is chosen by score, not by who spoke first
+
+    def emit(self, type, **fields):
+        if self.listener is not None:
+            self.listener({"type" : type, **fields})
+
+    @contextlib.contextmanager
+    def stage(self, name, **attributes):
+        """
+        A span that also emits "stage" started and done events.
+        """
+        self.emit("stage", stage=name, status="started")
+        with span(name, **attributes) as s:
+            yield s
+        self.emit("stage", stage=name, status="done", seconds=s.seconds)
+
+    def lead(self, response_id):
+        self.leader = response_id
+        if response_id is not None:
+            self.emit("leader", response_id=response_id, model=self.models.get(response_id), text=self.texts.get(response_id, ""))
+
+    def token_listener(self, response_id, model):
+        """
+        Returns the on_token callback for one expert, or None when there is no listener (no need to stream).
+        """
+        if self.listener is None:
+            return None
+        self.texts[response_id] = ""
+        self.models[response_id] = model["name"]
+
+        def on_token(text):
+            self.texts[response_id] += text
+            if self.leader is None and not self.scored:
+                self.lead(response_id)
+            elif self.leader == response_id and text:
+                self.emit("token", response_id=response_id, text=text)
+        return on_token
+
+    def failed(self, response_id):
+        """
+        Drops an expert that timed out or failed; if it was leading, the expert with the most text takes over.
+        """
+        self.texts.pop(response_id, None)
+        if self.leader == response_id:
+            self.lead(max(self.texts, key=lambda r: len(self.texts[r]), default=None))
+
+    def rescore(self, cells):
+        """
+        Moves the lead to the best average total among the scored responses.
+        - cells: {(judge name, response_id): score}, as filled by the scoring functions.
+        """
+        totals = {}
+        for (_, response_id), cell in cells.items():
+            if response_id in self.texts:
+                totals.setdefault(response_id, []).append(cell["total"])
+        if not totals:
+            return
+        self.scored = True
+        best = max(totals, key=lambda r: statistics.mean(totals[r]))
+        if best != self.leader:
+            self.lead(best)
+
+    def final(self, result):
+        best = result["best_response"]
+        model = next((m["name"] for m in MODELS if m["id"] == best["model_id"]), None)
+        self.emit("final", response_id=best["response_id"], model=model, text=output_text(best["text"]),
+                  tier=result.get("tier"), confirmed=best["response_id"] == self.leader)
+
+async def run_council(question, vs, k=CONTEXT_CANDIDATES, batched=BATCHED_SCORING, cache=None, adaptive=ADAPTIVE_SCORING,
+                      cascade=CASCADE, on_event=None):
+    """
+    Answers one question end to end: retrieval, context packing, pipelined generation and scoring, audit and aggregation.
+    Many questions can be in flight on one event loop; calls per model stay capped by CONCURRENCY_LIMITS.
+    With batched scoring each judge sees all responses in one call, after every expert has finished.
+    With adaptive scoring judges are asked in rounds, after every expert has finished, until the best response on the
+    raw (pre-audit) scores is decided.
+    - k: chunks retrieved; they are deduplicated and packed into CONTEXT_TOKEN_BUDGET for the experts.
+    - cache: a CouncilCache; repeated questions over the same context are answered from it.
+    - cascade: try acascade_answer first and only convene the full council when its answer is not accepted.
+    - on_event: listener for CouncilStream events (stage progress, the provisional answer and the final one).
+    Returns a dict with the context, responses, scoring_matrix, audit, averages, best_response,
+    the tier ("cascade" or "council") that answered and the seconds spent per stage ("timings").
+    """
+    started = time.perf_counter()
+    timings = {}
+    stream = CouncilStream(on_event)
+    with span("question", question=question[:200]) as question_span:
+        with stream.stage("retrieval", k=k, hybrid=HYBRID_RETRIEVAL) as s:
+            context = await ahybrid_search(vs, question, k=k) if HYBRID_RETRIEVAL else await vs.asimilarity_search(question, k=k)
+        timings["retrieval"] = s.seconds
+        log("Context retrieved from vector database")
+        if cache is not None:
+            cached = await cache.aget(question, context)
+            if cached is not None:
+                question_span.set(tier="cache")
+                log("Answer served from the council cache")
+                stream.final(cached)
+                return cached
+        with stream.stage("packing", chunks=len(context)) as s:
+            packed_context = await apack_context(vs, question, context)
+        timings["packing"] = s.seconds
+        if cascade:
+            with stream.stage("cascade") as s:
+                response, scoring_matrix, accepted = await acascade_answer(question, packed_context, stream=stream)
+                s.set(accepted=accepted)
+            timings["cascade"] = s.seconds
+            if accepted:
+                log(f"Answered by the cascade tier ({response['response_id']})")
+                question_span.set(tier="cascade")
+                result = {
+                    "question" : question,
+                    "context" : context,
+                    "packed_context" : packed_context,
+                    "responses" : [response],
+                    "scoring_matrix" : scoring_matrix,
+                    "audit" : None,
+                    "averages" : compute_average_totals(scoring_matrix),
+                    "best_response" : response,
+                    "tier" : "cascade",
+                    "timings" : timings
+                }
+                stream.final(result)
+                return await finish_council(result, started, cache)
+            log("Cascade answer not accepted, escalating to the full council")
+            # The tier-1 answer and its judge's score are part of the council's, not asked again
+            known_responses = [response] if response is not None else []
+            known_cells = {(judge, response_id) : cell for judge, row in scoring_matrix.items() for response_id, cell in row.items()}
+        else:
+            known_responses, known_cells = [], {}
+        with stream.stage("generation_scoring", batched=batched, adaptive=adaptive) as s:
+            if batched or adaptive:
+                # Batches and adaptive rounds need every response, so there is nothing to pipeline
+                responses, user_prompt = await agenerate_expert_response(question, packed_context, stream=stream,
+                                                                         known_responses=known_responses)
+                scoring_matrix = await agenerate_scores(responses, user_prompt, batched=batched, adaptive=adaptive,
+                                                        known_cells=known_cells)
+                stream.rescore({(judge, response_id) : cell for judge, row in scoring_matrix.items() for response_id, cell in row.items()})
+            else:
+                responses, user_prompt, scoring_matrix = await agenerate_pipelined_council(question, packed_context, stream=stream,
+                                                                                           known_responses=known_responses,
+                                                                                           known_cells=known_cells)
+        timings["generation_scoring"] = s.seconds
+        # agenerate_audit_report has its own "audit" span
+        stream.emit("stage", stage="audit", status="started")
+        audit_started = time.perf_counter()
+        audit, _ = await agenerate_audit_report(question, responses, scoring_matrix)
+        timings["audit"] = time.perf_counter() - audit_started
+        stream.emit("stage", stage="audit", status="done", seconds=timings["audit"])
+        with stream.stage("aggregation") as s:
+            scoring_matrix, averages, best_response = audited_scoring_matrix(audit, scoring_matrix, responses)
+        timings["aggregation"] = s.seconds
+        question_span.set(tier="council", best_response=best_response["response_id"])
+        result = {
+            "question" : question,
+            "context" : context,
+            "packed_context" : packed_context,
+            "responses" : responses,
+            "scoring_matrix" : scoring_matrix,
+            "audit" : audit,
+            "averages" : averages,
+            "best_response" : best_response,
+            "tier" : "council",
+            "timings" : timings
+        }
+        stream.final(result)
+        return await finish_council(result, started, cache)
+
+async def finish_council(result, started, cache=None):
+    """
+    Records the answering tier's latency in cascade_stats and caches the result.
+    """
+    tier = cascade_stats[result["tier"]]
+    tier["answered"] += 1
+    tier["seconds"] += time.perf_counter() - started
+    if cache is not None:
+        await cache.aput(result["question"], result["context"], result)
+    return result
+
 def print_with_bold(text):
     """
     Prints text with **bold** markers converted to terminal bold.
@@ -211,34 +858,28 @@ def print_with_bold(text):
     print(formatted_text)
 
 def compute_average_totals(scoring_matrix):
-    totals = {}      # collects all totals per response_id
-    counts = {}      # counts how many values per response_id
-    for model_data in scoring_matrix.values():
-        for response_id, response_content in model_data.items():
-            total_value = response_content["total"]
-            if response_id not in totals:
-                totals[response_id] = 0
-                counts[response_id] = 0
-            totals[response_id] += total_value
-            counts[response_id] += 1
-    averages = {response_id: totals[response_id] / counts[response_id]
-                for response_id in totals}
-    return averages
+    """
+    Average total per response_id over the judges that scored it. The cells' stored totals are
+    averaged as they are, so a matrix returned by audited_scoring_matrix keeps its normalization.
+    """
+    tensor = ScoringTensor.from_totals(scoring_matrix)
+    _, averages, _ = tensor.aggregate()
+    return {r : float(a) for r, a in zip(tensor.response_ids, averages) if not np.isnan(a)}
 
 
 def audited_scoring_matrix(audit , scoring_matrix, responses):
-    normalized_scoring_matrix = scoring_matrix
+    """
+    Applies the audit (normalization factors and dropped judges) to the scoring matrix and picks the best response.
+    An audit of None (it could not be parsed) normalizes and drops nothing. The input matrix is not modified.
+    Returns the normalized scoring matrix, the average total per response_id and the best response.
+    """
+    if not responses:
+        raise ValueError("No expert produced a response")
     response_ids = [k['response_id'] for k in responses]
-    audit_json = ast.literal_eval('{'+extract_first_curly_balanced(audit)+"}")
-    for model in audit_json['normalization']:
-        for j in normalized_scoring_matrix[model]:
-            normalized_scoring_matrix[model][j]['total'] *= audit_json['normalization'][model]
-    for drops in audit_json['drops']:
-        normalized_scoring_matrix.pop(drops)
-    try:
-        averages_json = compute_average_totals(normalized_scoring_matrix)
-        best_response = responses[response_ids.index(max(averages_json))]
-    except:
-        # averages_json = compute_average_totals(scoring_matrix)
-        best_response = responses[0]
+    audit_json = parse_output(audit, Audit_Report) if audit is not None else {"normalization" : {}, "drops" : []}
+    tensor = ScoringTensor.from_matrix(scoring_matrix, response_ids)
+    totals, averages, best = tensor.aggregate(audit_json['normalization'], audit_json['drops'])
+    normalized_scoring_matrix = tensor.to_matrix(scoring_matrix, totals, audit_json['drops'])
+    averages_json = {r : float(a) for r, a in zip(response_ids, averages) if not np.isnan(a)}
+    best_response = responses[best] if best >= 0 else responses[0]
     return normalized_scoring_matrix, averages_json, best_response
@@ -0,0 +1,225 @@
+###############################################################################
+# Name : fake_llm
+# Function : Deterministic local stand-ins for the council models and the
+#            embeddings, so the council can be run and benchmarked with no
+#            network and no Ollama. Outputs are templated per prompt type
+#            (expert, judge, batch judge, repair, auditor) and seeded from the
+#            prompt, judges can be made to return malformed JSON, and every
+#            call sleeps for a latency drawn from a lognormal distribution
+# Usage : AI_COUNCIL_FAKE_MODELS=1 puts fake_models() in MODELS and
+#         FakeEmbeddings behind get_embeddings()
+###############################################################################
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+CRITERIA = ["accuracy", "completeness", "grounding", "reasoning", "clarity"]
+DEFAULT_LATENCY = {          # prompt type -> (median seconds, lognormal sigma)
+    "expert" : (0.2, 0.4),
+    "judge" : (0.05, 0.3),
+    "batch_judge" : (0.1, 0.3),
+    "repair" : (0.02, 0.2),
+    "auditor" : (0.1, 0.3)
+}
+FIRST_TOKEN_SHARE = 0.2     # share of a streamed call's latency spent before the first token
+
+fake_stats = Counter()      # "calls:<type>", "malformed:<type>" and "embedded" counts since the last reset
+
+
+def prompt_kind(prompt):
+    """
+    Which council prompt this is, recognised by the wording of the templates in prompts.py.
+    """
+    if "Your previous reply could not be used" in prompt:
+        return "repair"
+    if "independent auditor" in prompt:
+        return "auditor"
+    if "CANDIDATE RESPONSES" in prompt:
+        return "batch_judge"
+    if "CANDIDATE RESPONSE" in prompt:
+        return "judge"
+    return "expert"
+
+def seeded(*parts):
+    return random.Random(hashlib.sha256("\x1f".join(str(p) for p in parts).encode()).digest())
+
+def candidate_quality(candidate):
+    """
+    Every judge sees the same underlying quality for a candidate, so judges mostly agree.
+    """
+    return seeded("quality", candidate).uniform(1.5, 5.0)
+
+def candidate_text(part):
+    """
+    The text of one candidate as the judge prompt shows it (a response dict), the same whether
+    it was scored alone or in a batch.
+    """
+    return part.split("'text': ", 1)[-1].strip().rstrip("],").strip().rstrip("}")
+
+def score_object(model_name, candidate, rng):
+    quality = candidate_quality(candidate)
+    scores = {c : int(min(5, max(1, round(quality + rng.gauss(0, 0.6))))) for c in CRITERIA}
+    return {"scores" : scores, "confidence_estimate" : round(rng.uniform(0.5, 0.95), 2),
+            "justification" : f"Scored by {model_name} against the rubric."}
+
+def malform(text, rng):
+    """
+    One of the ways judge replies go wrong: harmless wrappers, syntax the tolerant parser
+    repairs, a missing field (needs a re-ask) or no JSON at all (lost).
+    """
+    kind = rng.choice(["fence", "prose", "trailing_comma", "single_quotes", "truncated", "missing_field", "no_json"])
+    if kind == "fence":
+        return "```json\n" + text + "\n```"
+    if kind == "prose":
+        return "Here is my evaluation:\n" + text + "\nI hope this helps."
+    if kind == "trailing_comma":
+        return text[:-1] + ",}"
+    if kind == "single_quotes":
+        return text.replace("'", "").replace('"', "'")
+    if kind == "truncated":
+        return text[:int(len(text) * rng.uniform(0.5, 0.9))]
+    if kind == "missing_field":
+        return re.sub(r', "confidence_estimate": [0-9.]+', "", text)
+    return "I would rate this response as fairly good overall."
+
+
+class FakeLLM(LLM):
+    """
+    Templated, seeded stand-in for an Ollama or OpenAI model; works anywhere MODELS expects an "llm".
+    - latency: {prompt type: (median seconds, sigma)} overriding DEFAULT_LATENCY.
+    - malformed_rate: share of judge and auditor replies that are malformed (see malform).
+    """
+    model_name : str = "fake"
+    latency : Dict[str, Any] = {}
+    malformed_rate : float = 0.0
+    seed : int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-council"
+
+    def _plan(self, prompt):
+        kind = prompt_kind(prompt)
+        rng = seeded(self.seed, self.model_name, prompt)
+        median, sigma = {**DEFAULT_LATENCY, **self.latency}[kind]
+        fake_stats[f"calls:{kind}"] += 1
+        return kind, rng, median * rng.lognormvariate(0, sigma)
+
+    def _output(self, kind, prompt, rng):
+        if kind == "expert":
+            snippet = re.search(r"\[1\][^\n]*\n([^\n]{0,160})", prompt)
+            answer = snippet.group(1).strip() if snippet else "Not in context."
+            return f"1. {answer}\n2. The context states this directly ({self.model_name}).\n3. Snippets used: {1 if snippet else 'none'}"
+        if kind == "repair":
+            previous = prompt.split("PREVIOUS REPLY:", 1)[-1]
+            if "audit_id" in prompt:
+                return json.dumps(self.audit_object())
+            ids = re.findall(r"response_id['\"]?\s*[:=]\s*['\"]([^'\"]+)", previous)
+            if ids:
+                return json.dumps({"results" : [{"response_id" : r, **score_object(self.model_name, r, rng)} for r in ids]})
+            return json.dumps(score_object(self.model_name, previous, rng))
+        if kind == "auditor":
+            text = json.dumps(self.audit_object())
+        elif kind == "batch_judge":
+            section = prompt.split("CANDIDATE RESPONSES", 1)[-1].split("RUBRIC", 1)[0]
+            parts = section.split("{'response_id': '")[1:]
+            text = json.dumps({"results" : [{"response_id" : part.split("'", 1)[0], **score_object(self.model_name, candidate_text(part), rng)}
+                                            for part in parts]})
+        else:
+            candidate = prompt.split("CANDIDATE RESPONSE you must evaluate:", 1)[-1].split("RUBRIC", 1)[0]
+            text = json.dumps(score_object(self.model_name, candidate_text(candidate), rng))
+        if rng.random() < self.malformed_rate:
+            fake_stats[f"malformed:{kind}"] += 1
+            return malform(text, rng)
+        return text
+
+    def audit_object(self):
+        return {"audit_id" : f"audit_{self.model_name}", "flags" : [], "drops" : [],
+                "explanation" : "No anomalies detected.", "normalization" : {}}
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        kind, rng, delay = self._plan(prompt)
+        time.sleep(delay)
+        return self._output(kind, prompt, rng)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        kind, rng, delay = self._plan(prompt)
+        await asyncio.sleep(delay)
+        return self._output(kind, prompt, rng)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        """
+        Word by word, the first after FIRST_TOKEN_SHARE of the latency and the rest spread over the remainder.
+        """
+        kind, rng, delay = self._plan(prompt)
+        pieces = re.findall(r"\s*\S+\s*", self._output(kind, prompt, rng)) or [""]
+        time.sleep(delay * FIRST_TOKEN_SHARE)
+        for piece in pieces:
+            yield GenerationChunk(text=piece)
+            time.sleep(delay * (1 - FIRST_TOKEN_SHARE) / len(pieces))
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        kind, rng, delay = self._plan(prompt)
+        pieces = re.findall(r"\s*\S+\s*", self._output(kind, prompt, rng)) or [""]
+        await asyncio.sleep(delay * FIRST_TOKEN_SHARE)
+        for piece in pieces:
+            yield GenerationChunk(text=piece)
+            await asyncio.sleep(delay * (1 - FIRST_TOKEN_SHARE) / len(pieces))
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors: deterministic, and texts sharing words are close, so retrieval
+    over a synthetic corpus behaves like retrieval over a real one.
+    - latency: seconds per embedding call.
+    """
+    def __init__(self, dim=256, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.model = f"fake-hash-{dim}"
+
+    def vector(self, text):
+        vector = np.zeros(self.dim, dtype="float32")
+        for word in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        fake_stats["embedded"] += len(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(self.latency)
+        fake_stats["embedded"] += len(texts)
+        return [self.vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+def fake_models(n_experts=4, latency=None, malformed_rate=0.05, seed=0, backend="ollama"):
+    """
+    A MODELS list of n_experts fake experts (who also judge) and one fake evaluator.
+    - backend: the CONCURRENCY_LIMITS entry the fakes are capped by.
+    """
+    models = [{"id" : f"expert_{i + 1}", "name" : f"fake-expert-{i + 1}", "backend" : backend,
+               "llm" : FakeLLM(model_name=f"fake-expert-{i + 1}", latency=latency or {}, malformed_rate=malformed_rate, seed=seed)}
+              for i in range(n_experts)]
+    models.append({"id" : "evaluator", "name" : "fake-evaluator", "backend" : backend,
+                   "llm" : FakeLLM(model_name="fake-evaluator", latency=latency or {}, malformed_rate=malformed_rate, seed=seed)})
+    return models
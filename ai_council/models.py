@@ -0,0 +1,134 @@
+###############################################################################
+# Name : models
+# Function : Lazy model registry. A MODELS entry is configuration only (id,
+#            name, backend, model, client options); its "llm" client is built
+#            the first time it is looked up, and the backend's LangChain
+#            package is only imported then. Importing the council no longer
+#            builds (or needs credentials for) every client of both modes
+# Usage : LazyModel(id="expert_1", name="phi3:mini", backend="ollama", model="phi3:mini")
+#         entry["llm"] builds the client once; entries with an "llm" are used as is.
+#         Clients of the same host share one HTTP connection pool (http_pool),
+#         and awarm_up preloads a model before the first question
+###############################################################################
+import asyncio
+import os
+import threading
+import weakref
+
+_build_lock = threading.Lock()
+_pool_lock = threading.Lock()
+_pools = {}         # (backend, host) -> shared sync and async HTTP transports or clients
+
+
+class LoopTransports:
+    """
+    httpx async transport keeping one connection pool per event loop: async connections cannot
+    be used from another loop, and the council loop is not the only one a caller may run on.
+    """
+    def __init__(self, limits):
+        self.limits = limits
+        self.transports = weakref.WeakKeyDictionary()     # event loop -> httpx.AsyncHTTPTransport
+
+    def transport(self):
+        import httpx
+        loop = asyncio.get_running_loop()
+        if loop not in self.transports:
+            self.transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+        return self.transports[loop]
+
+    async def handle_async_request(self, request):
+        return await self.transport().handle_async_request(request)
+
+    async def aclose(self):
+        transport = self.transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def model_host(backend, options):
+    if backend == "openai":
+        return options.get("base_url") or os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+    return options.get("base_url") or os.environ.get("OLLAMA_HOST") or "http://127.0.0.1:11434"
+
+def http_pool(backend, host):
+    """
+    The HTTP connection pool shared by every client of one backend host, created on first use.
+    Ollama clients wrap shared transports in their own httpx clients (they set their own base
+    URL and headers); OpenAI clients share whole httpx clients.
+    Returns {"sync": ..., "async": ...}.
+    """
+    import httpx
+    from ai_council.constants import HTTP_POOL_LIMITS
+    with _pool_lock:
+        if (backend, host) not in _pools:
+            limits = httpx.Limits(**HTTP_POOL_LIMITS)
+            pool = {"sync" : httpx.HTTPTransport(limits=limits), "async" : LoopTransports(limits)}
+            if backend == "openai":
+                import openai
+                pool = {"sync" : openai.DefaultHttpxClient(transport=pool["sync"]),
+                        "async" : openai.DefaultAsyncHttpxClient(transport=pool["async"])}
+            _pools[(backend, host)] = pool
+        return _pools[(backend, host)]
+
+def build_llm(backend, model, options=None):
+    """
+    Builds the LangChain client for one model, importing its backend package on demand.
+    - backend: "ollama" or "openai".
+    - options: extra keyword arguments for the client (temperature, base_url, ...).
+    """
+    from ai_council.constants import MODEL_KEEP_ALIVE
+    options = options or {}
+    pool = http_pool(backend, model_host(backend, options))
+    if backend == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=model, **{"http_client" : pool["sync"], "http_async_client" : pool["async"], **options})
+    if backend == "ollama":
+        from langchain_ollama import OllamaLLM
+        return OllamaLLM(model=model, **{"keep_alive" : MODEL_KEEP_ALIVE, "sync_client_kwargs" : {"transport" : pool["sync"]},
+                                         "async_client_kwargs" : {"transport" : pool["async"]}, **options})
+    raise ValueError(f"Unknown model backend {backend!r}")
+
+async def awarm_up(model):
+    """
+    Preloads one model so the first question does not pay for it: Ollama loads the model into
+    memory for MODEL_KEEP_ALIVE (a generate call without a prompt only loads), OpenAI opens the
+    pooled TLS connection. Entries that are not LazyModels (fake models) only build their client.
+    """
+    llm = model["llm"]
+    if not isinstance(model, LazyModel):
+        return
+    if model["backend"] == "ollama":
+        from ollama import AsyncClient
+        from ai_council.constants import MODEL_KEEP_ALIVE
+        host = model_host("ollama", model["options"])
+        client = AsyncClient(host=host, transport=http_pool("ollama", host)["async"])
+        await client.generate(model=model["model"], prompt="", keep_alive=model["options"].get("keep_alive", MODEL_KEEP_ALIVE))
+    elif model["backend"] == "openai":
+        await llm.root_async_client.models.retrieve(model["model"])
+
+
+class LazyModel(dict):
+    """
+    A MODELS entry whose "llm" is built from its configuration on first access.
+    Everything else reads like the plain dict entries: model["name"], model["backend"], ...
+    """
+    def __init__(self, id, name, backend, model=None, options=None, **extra):
+        super().__init__(id=id, name=name, backend=backend, model=model or name, options=options or {}, **extra)
+
+    def __missing__(self, key):
+        if key != "llm":
+            raise KeyError(key)
+        with _build_lock:
+            if "llm" not in self:
+                self["llm"] = build_llm(self["backend"], self["model"], self["options"])
+        return dict.__getitem__(self, "llm")
+
+    @property
+    def built(self):
+        return "llm" in self
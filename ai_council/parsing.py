@@ -0,0 +1,195 @@
+import re
+import json
+
+# One token per match: whitespace and comments are skipped, strings are read by STRING_PATTERNS
+TOKEN = re.compile(r"""\s+|//[^\n]*|\#[^\n]*|/\*.*?(?:\*/|$)|(?P<quote>["'])|(?P<punct>[{}\[\]:,])|(?P<word>[A-Za-z0-9_+\-.]+)|.""", re.S)
+STRING_PATTERNS = {
+    '"' : re.compile(r'"((?:[^"\\]|\\.)*)("?)', re.S),
+    "'" : re.compile(r"'((?:[^'\\]|\\.)*)('?)", re.S),
+}
+ESCAPE = re.compile(r"\\(u[0-9a-fA-F]{4}|.)", re.S)
+ESCAPES = {"n" : "\n", "t" : "\t", "r" : "\r", "b" : "\b", "f" : "\f"}
+NUMBER = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+LITERALS = {"true" : "true", "false" : "false", "null" : "null", "True" : "true", "False" : "false", "None" : "null"}
+
+
+def output_text(result):
+    """
+    Returns the text of an LLM output: a plain string (Ollama) or a chat message (online).
+    """
+    text = getattr(result, "content", result)
+    return text if isinstance(text, str) else str(text)
+
+def decode_string(body):
+    """
+    Decodes the escapes of a JSON or Python string body; unknown escapes keep the escaped character.
+    """
+    def unescape(m):
+        escape = m.group(1)
+        if escape[0] == "u" and len(escape) == 5:
+            return chr(int(escape[1:], 16))
+        return ESCAPES.get(escape, escape)
+    return ESCAPE.sub(unescape, body)
+
+def tokenize(text, start):
+    """
+    Yields (kind, value, complete) tokens of a JSON-like text from start. complete is False
+    for a string or word cut off by the end of the text.
+    """
+    position = start
+    while position < len(text):
+        m = TOKEN.match(text, position)
+        if m.group("quote"):
+            s = STRING_PATTERNS[m.group("quote")].match(text, position)
+            position = s.end()
+            yield "string", decode_string(s.group(1)), bool(s.group(2))
+            continue
+        position = m.end()
+        if m.group("punct"):
+            yield m.group("punct"), None, True
+        elif m.group("word"):
+            yield "word", m.group("word"), position < len(text)
+
+def word_value(word):
+    """
+    JSON for an unquoted word: Python/JSON literals and numbers as such, anything else as a string.
+    """
+    if word in LITERALS:
+        return LITERALS[word]
+    if NUMBER.fullmatch(word):
+        number = word.lstrip("+")
+        number = number.rstrip(".") if "e" not in number.lower() else number
+        return "0" + number if number.startswith(".") else number.replace("-.", "-0.")
+    return json.dumps(word)
+
+def repair_json(text):
+    """
+    Turns the first JSON object in an LLM output into strict JSON in a single pass.
+    Tolerates prose and markdown fences around it, // # and /* */ comments, single quotes,
+    unquoted keys, Python literals, trailing or missing commas, and output cut off part way
+    (dangling keys are dropped and open strings and brackets closed).
+    Raises ValueError if there is no object.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found")
+    out = []
+    # One entry per open container: [closer, state, mark, pending_comma]
+    # state is what comes next: "key", "colon", "value" or "comma"; mark is where the current member starts in out
+    stack = []
+
+    def begin_member(top):
+        if top[1] == "comma":
+            top[3] = True
+        top[2] = len(out)
+        if top[3]:
+            out.append(",")
+            top[3] = False
+
+    def close(top):
+        if top[1] in ("colon", "value") and top[0] == "}":
+            # Key without a value
+            del out[top[2]:]
+        out.append(top[0])
+        stack.pop()
+        if stack:
+            stack[-1][1] = "comma"
+
+    for kind, value, complete in tokenize(text, start):
+        top = stack[-1] if stack else None
+        if kind in "{[":
+            if top is None:
+                if out:
+                    break
+            elif top[0] == "}" and top[1] in ("key", "comma"):
+                continue    # a container cannot be a key
+            elif top[0] == "}":
+                if top[1] == "colon":
+                    out.append(":")
+            else:
+                begin_member(top)
+            out.append(kind)
+            stack.append(["}" if kind == "{" else "]", "key" if kind == "{" else "value", len(out), False])
+        elif top is None:
+            break
+        elif kind in "}]":
+            while stack and stack[-1][0] != kind:
+                close(stack[-1])
+            if stack:
+                close(stack[-1])
+            if not stack:
+                break
+        elif kind == ":":
+            if top[1] == "colon":
+                out.append(":")
+                top[1] = "value"
+        elif kind == ",":
+            if top[1] == "comma":
+                top[1] = "key" if top[0] == "}" else "value"
+                top[3] = True
+        else:
+            if not complete and kind == "word":
+                # A word cut off by the end of the output may be incomplete, drop its member
+                if top[0] == "}" and top[1] in ("colon", "value"):
+                    del out[top[2]:]
+                    top[1] = "comma"
+                break
+            token = json.dumps(value) if kind == "string" else word_value(value)
+            if top[0] == "}" and top[1] in ("key", "comma"):
+                begin_member(top)
+                out.append(token if kind == "string" else json.dumps(value))
+                top[1] = "colon"
+            elif top[0] == "}":
+                if top[1] == "colon":
+                    out.append(":")
+                out.append(token)
+                top[1] = "comma"
+            else:
+                begin_member(top)
+                out.append(token)
+                top[1] = "comma"
+            if not complete:
+                # A string cut off by the end of the output: keep its text unless it was a key
+                if top[0] == "}" and top[1] == "colon":
+                    del out[top[2]:]
+                    top[1] = "comma"
+                break
+
+    while stack:
+        close(stack[-1])
+    return "".join(out)
+
+def loads_tolerant(text):
+    """
+    Parses the first JSON object in an LLM output, see repair_json.
+    Well-formed objects (with or without prose around them) skip the repair scan.
+    """
+    text = output_text(text)
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        try:
+            return json.loads(text[start:end + 1], strict=False)
+        except ValueError:
+            pass
+    return json.loads(repair_json(text), strict=False)
+
+def parse_output(result, schema=None):
+    """
+    Parses an LLM output and validates it against a pydantic model.
+    Returns a plain dict. Raises ValueError (pydantic's ValidationError is one) when it does not fit.
+    """
+    data = loads_tolerant(result)
+    if schema is None:
+        return data
+    return schema.model_validate(data).model_dump()
+
+def describe_error(error, limit=600):
+    """
+    Short description of a parse or validation error, for logs and the repair prompt.
+    """
+    errors = getattr(error, "errors", None)
+    if callable(errors):
+        text = "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'output'}: {e['msg']}" for e in errors())
+    else:
+        text = str(error)
+    return text[:limit]
@@ -16,6 +16,12 @@ class scoring_output(BaseModel):
     confidence_estimate : float
     justification : str
 
+class keyed_scoring_output(scoring_output):
+    response_id : str
+
+class batch_scoring_output(BaseModel):
+    results : List[keyed_scoring_output]
+
 
 ##### Audit Output Format
 class flag(BaseModel):
@@ -60,6 +66,38 @@ scoring_template ="""
     - Do not include comments or explanatory text.
 """
 
+batch_scoring_template ="""
+    SYSTEM: You are an impartial evaluator that scores candidate answers to a user prompt. Use the rubric provided and be objective. 
+    Return only the JSON object described below and nothing else.
+
+    USER: Here is the ORIGINAL USER PROMPT:
+    {user_prompt}
+
+    Here are the CANDIDATE RESPONSES you must evaluate, each with its response_id:
+    {candidate_responses}
+
+    RUBRIC (score each 1-5; 5 = best):
+    - accuracy: Is the content factually correct given known, verifiable facts? (1 = many factual errors or hallucinations; 5 = fully accurate)
+    - completeness: Does it address all parts of the prompt? (1 = misses core parts; 5 = full coverage)
+    - grounding: Does the response cite or reference verifiable sources or show evidence/reasoning that can be checked? (1 = unsupported claims; 5 = well-grounded)
+    - reasoning: Are the logical steps coherent and correct? (1 = flawed reasoning; 5 = sound stepwise logic)
+    - clarity: Is it readable, appropriately toned, and well-structured? (1 = confusing; 5 = clear & concise)
+
+    Score every candidate independently of the others. For each one provide its response_id, the scores,
+    a one-sentence justification for the total score and a confidence estimate between 0 and 1.
+
+    Output Format : 
+    {output_format}
+
+    Notes:
+    - Score numerically and be conservative: penalize minor hallucinations or unsupported numeric claims.
+    - Do not refer to model names, internals, or policies in your justification.Constraints:
+    - Output must be strictly valid JSON (use "null" for missing, numbers must be numeric).
+    - Return exactly one entry in "results" per candidate response.
+    - Do not include trailing commas.
+    - Do not include comments or explanatory text.
+"""
+
 expert_generation_template = """
     SYSTEM:
     You are a retrieval-grounded assistant. Use only the information in the CONTEXT. 
@@ -84,6 +122,21 @@ expert_generation_template = """
 """
 
 
+repair_template = """
+    SYSTEM: Your previous reply could not be used because it does not match the required JSON format.
+    Return only the corrected JSON object and nothing else. Keep every value you already gave and only fix the problems listed.
+
+    PREVIOUS REPLY:
+    {previous_output}
+
+    PROBLEMS:
+    {errors}
+
+    Output Format :
+    {output_format}
+"""
+
+
 auditor_prompt_template = """
     SYSTEM: You are an independent auditor whose job is to inspect a scoring matrix produced by peer models and detect bias, collusion, or anomalous scoring patterns. Return only the JSON described below.
 
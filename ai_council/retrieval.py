@@ -0,0 +1,138 @@
+import os
+import asyncio
+import numpy as np
+from ai_council.constants import *
+
+
+def reciprocal_rank_fusion(rankings, k=4, rrf_k=RRF_K):
+    """
+    Fuses ranked lists of ids: every id scores sum(1 / (rrf_k + rank)) over the lists it appears in.
+    Returns the k best ids, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+def fuse(vs, dense, lexical, k, rrf_k):
+    """
+    Combines dense (Document, score) hits and lexical (doc_id, bm25) hits into k Documents.
+    """
+    documents = {doc.id : doc for doc, _ in dense}
+    ids = reciprocal_rank_fusion([[doc.id for doc, _ in dense], [doc_id for doc_id, _ in lexical]], k, rrf_k)
+    return [documents[doc_id] if doc_id in documents else vs.docstore.search(doc_id) for doc_id in ids]
+
+def hybrid_search(vs, query, k=4, fetch_k=HYBRID_FETCH_K, rrf_k=RRF_K):
+    """
+    Retrieves k chunks by fusing vector similarity with BM25 over the same chunks, so exact
+    terms (clause numbers, defined terms) are found even when the embedding misses them.
+    Falls back to plain vector search for stores without a lexical index.
+    """
+    if not hasattr(getattr(vs, "docstore", None), "lexical_search"):
+        return vs.similarity_search(query, k=k)
+    dense = vs.similarity_search_with_score(query, k=fetch_k)
+    lexical = vs.docstore.lexical_search(query, fetch_k)
+    return fuse(vs, dense, lexical, k, rrf_k)
+
+async def ahybrid_search(vs, query, k=4, fetch_k=HYBRID_FETCH_K, rrf_k=RRF_K):
+    """
+    Async version of hybrid_search.
+    """
+    if not hasattr(getattr(vs, "docstore", None), "lexical_search"):
+        return await vs.asimilarity_search(query, k=k)
+    dense = await vs.asimilarity_search_with_score(query, k=fetch_k)
+    lexical = await asyncio.get_running_loop().run_in_executor(None, vs.docstore.lexical_search, query, fetch_k)
+    return fuse(vs, dense, lexical, k, rrf_k)
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate used for the context budget.
+    """
+    return -(-len(text) // CONTEXT_CHARS_PER_TOKEN)
+
+def trim_overlap(previous, text, max_overlap=200):
+    """
+    Drops the start of text that repeats the end of previous (splitter chunk_overlap).
+    """
+    for size in range(min(max_overlap, len(previous), len(text)), 20, -1):
+        if previous.endswith(text[:size]):
+            return text[size:].lstrip()
+    return text
+
+def mmr_order(query_vector, doc_vectors, mmr_lambda=CONTEXT_MMR_LAMBDA, duplicate_similarity=CONTEXT_DUPLICATE_SIMILARITY):
+    """
+    Orders documents by maximal marginal relevance, leaving out near duplicates of earlier picks.
+    Returns the kept indices, best first.
+    """
+    vectors = np.asarray(doc_vectors, dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    query = np.asarray(query_vector, dtype="float32")
+    relevance = vectors @ (query / (np.linalg.norm(query) + 1e-12))
+    similarity = vectors @ vectors.T
+    order, remaining = [], list(range(len(vectors)))
+    while remaining:
+        if order:
+            redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        pick = remaining.pop(best)
+        if redundancy[best] < duplicate_similarity:
+            order.append(pick)
+    return order
+
+def format_snippet(number, doc, text):
+    """
+    One numbered snippet, keeping only the file name and page of the metadata.
+    """
+    source = os.path.basename(str(doc.metadata.get("source", "")))
+    page = doc.metadata.get("page")
+    origin = ", ".join(part for part in [source, f"p. {page}" if page is not None else ""] if part)
+    return f"[{number}] ({origin})\n{text}" if origin else f"[{number}]\n{text}"
+
+def pack_documents(docs, order, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Packs the documents in the given order into numbered snippets within the token budget.
+    """
+    snippets, used, packed = [], 0, []
+    for i in order:
+        doc = docs[i]
+        text = doc.page_content.strip()
+        for other in packed:
+            if other.metadata.get("source") == doc.metadata.get("source") and other.metadata.get("page") == doc.metadata.get("page"):
+                text = trim_overlap(other.page_content.strip(), text)
+        if not text:
+            continue
+        snippet = format_snippet(len(snippets) + 1, doc, text)
+        cost = estimate_tokens(snippet)
+        if used + cost > token_budget:
+            # Smaller snippets further down may still fit
+            continue
+        snippets.append(snippet)
+        packed.append(doc)
+        used += cost
+    return "\n\n".join(snippets)
+
+async def apack_context(vs, question, docs, token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=CONTEXT_MMR_LAMBDA):
+    """
+    Turns retrieved chunks into the context string for the experts: near duplicates are dropped
+    with MMR, metadata is cut to file and page, and snippets are packed into the token budget.
+    Chunk vectors come from the embedding cache, so this costs no extra embedding calls after ingestion.
+    """
+    if not docs:
+        return ""
+    query_vector = await vs.embeddings.aembed_query(question)
+    doc_vectors = await vs.embeddings.aembed_documents([doc.page_content for doc in docs])
+    return pack_documents(docs, mmr_order(query_vector, doc_vectors, mmr_lambda), token_budget)
+
+def pack_context(vs, question, docs, token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=CONTEXT_MMR_LAMBDA):
+    """
+    Synchronous version of apack_context.
+    """
+    if not docs:
+        return ""
+    query_vector = vs.embeddings.embed_query(question)
+    doc_vectors = vs.embeddings.embed_documents([doc.page_content for doc in docs])
+    return pack_documents(docs, mmr_order(query_vector, doc_vectors, mmr_lambda), token_budget)
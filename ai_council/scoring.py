@@ -0,0 +1,111 @@
+import numpy as np
+from ai_council.constants import WEIGHTS
+
+
+def aggregate(scores, weights, normalization=None, keep=None):
+    """
+    Vectorized council aggregation. Works on one question (J, R, C) or a stack of questions
+    (..., J, R, C); missing cells are NaN.
+    - weights: (C,) criterion weights.
+    - normalization: (..., J) factors the auditor applies to each judge's totals.
+    - keep: (..., J) False for judges the auditor dropped.
+    Returns totals (..., J, R), averages over the kept judges (..., R) with NaN where a response
+    has no score, and the index of the best response (...,), -1 where nothing was scored.
+    """
+    totals = scores @ weights
+    if normalization is not None:
+        totals *= normalization[..., :, None]
+    if keep is not None:
+        totals = np.where(keep[..., :, None], totals, np.nan)
+    scored = ~np.isnan(totals)
+    counts = scored.sum(axis=-2)
+    sums = np.where(scored, totals, 0.0).sum(axis=-2)
+    averages = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+    if averages.shape[-1] == 0:
+        return totals, averages, np.full(averages.shape[:-1], -1)
+    best = np.where(counts.any(axis=-1), np.where(counts > 0, averages, -np.inf).argmax(axis=-1), -1)
+    return totals, averages, best
+
+
+class ScoringTensor:
+    """
+    Scores of one question as a judges x responses x criteria array with labeled axes.
+    Cells a judge did not score (timeouts, parse failures) are NaN.
+    """
+    def __init__(self, judges, response_ids, criteria, scores, criterion_weights=None):
+        self.judges = list(judges)
+        self.response_ids = list(response_ids)
+        self.criteria = list(criteria)
+        self.scores = scores
+        self.criterion_weights = criterion_weights or WEIGHTS
+
+    @classmethod
+    def from_matrix(cls, scoring_matrix, response_ids=None, criteria=None):
+        """
+        Builds the tensor from the nested {judge: {response_id: {"scores": {...}}}} scoring matrix.
+        - response_ids: axis order, e.g. the order of the responses; defaults to order of appearance.
+        """
+        criteria = list(criteria or WEIGHTS)
+        judges = list(scoring_matrix)
+        if response_ids is None:
+            response_ids = list(dict.fromkeys(r for cells in scoring_matrix.values() for r in cells))
+        position = {r : i for i, r in enumerate(response_ids)}
+        scores = np.full((len(judges), len(response_ids), len(criteria)), np.nan)
+        for j, judge in enumerate(judges):
+            for response_id, cell in scoring_matrix[judge].items():
+                if response_id in position:
+                    scores[j, position[response_id]] = [cell["scores"][c] for c in criteria]
+        return cls(judges, response_ids, criteria, scores)
+
+    @classmethod
+    def from_totals(cls, scoring_matrix, response_ids=None):
+        """
+        Builds a one-criterion tensor from the "total" stored in each cell, so totals the audit
+        already normalized are averaged as they are instead of being recomputed from the scores.
+        """
+        totals = {judge : {response_id : {"scores" : {"total" : cell["total"]}} for response_id, cell in cells.items()}
+                  for judge, cells in scoring_matrix.items()}
+        tensor = cls.from_matrix(totals, response_ids, criteria=["total"])
+        tensor.criterion_weights = {"total" : 1.0}
+        return tensor
+
+    def weights(self, weights=None):
+        weights = weights or self.criterion_weights
+        return np.array([weights[c] for c in self.criteria], dtype=float)
+
+    def aggregate(self, normalization=None, drops=(), weights=None):
+        """
+        Applies the auditor's normalization factors ({judge: factor}) and drops (judge names).
+        Returns totals (J, R), averages (R,) and the best response index (-1 if nothing was scored).
+        """
+        factors = np.array([(normalization or {}).get(judge, 1.0) for judge in self.judges], dtype=float)
+        keep = np.array([judge not in drops for judge in self.judges], dtype=bool)
+        return aggregate(self.scores, self.weights(weights), factors, keep)
+
+    def to_matrix(self, scoring_matrix, totals, drops=()):
+        """
+        Returns a new nested scoring matrix with the given totals and without the dropped judges.
+        The input matrix is left untouched.
+        """
+        position = {r : i for i, r in enumerate(self.response_ids)}
+        return {judge : {response_id : {**cell, "total" : float(totals[j, position[response_id]])}
+                         for response_id, cell in scoring_matrix[judge].items() if response_id in position}
+                for j, judge in enumerate(self.judges) if judge not in drops}
+
+
+def stack_tensors(tensors):
+    """
+    Stacks many questions onto common judge and response axes for offline aggregation:
+    returns (judges, response_ids, criteria, scores) with scores of shape (Q, J, R, C).
+    """
+    judges = list(dict.fromkeys(j for t in tensors for j in t.judges))
+    response_ids = list(dict.fromkeys(r for t in tensors for r in t.response_ids))
+    criteria = tensors[0].criteria if tensors else list(WEIGHTS)
+    scores = np.full((len(tensors), len(judges), len(response_ids), len(criteria)), np.nan)
+    judge_index = {j : i for i, j in enumerate(judges)}
+    response_index = {r : i for i, r in enumerate(response_ids)}
+    for q, t in enumerate(tensors):
+        rows = [judge_index[j] for j in t.judges]
+        columns = [response_index[r] for r in t.response_ids]
+        scores[q][np.ix_(rows, columns)] = t.scores
+    return judges, response_ids, criteria, scores
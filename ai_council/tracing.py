@@ -0,0 +1,230 @@
+###############################################################################
+# Name : tracing
+# Function : Spans, metrics and log events for the council. Spans nest per
+#            asyncio task through a context variable, so concurrent questions
+#            never mix; each finished span feeds latency histograms and token
+#            counters labeled by span, model and outcome, exportable as
+#            Prometheus text or JSON (optionally served over HTTP). Log events
+#            go to registered listeners (e.g. the UI) instead of stdout
+###############################################################################
+import asyncio
+import bisect
+import contextvars
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from ai_council.constants import TRACE_BUFFER, TRACE_BUCKETS
+from ai_council.retrieval import estimate_tokens
+
+_current_span = contextvars.ContextVar("ai_council_span", default=None)
+_span_ids = itertools.count(1)
+_lock = threading.Lock()
+_log_listeners = []
+_span_listeners = []
+finished_spans = deque(maxlen=TRACE_BUFFER)     # most recent finished spans, as dicts
+_histograms = {}        # (span, model, outcome) -> {"buckets": [...], "count", "sum", "recent": deque}
+_tokens = {}            # (model, direction) -> count
+
+
+class Span:
+    """
+    One timed unit of work. Attributes are free-form; "model", "tokens_in" and "tokens_out"
+    also feed the metrics. outcome is "ok" unless set, or derived from an exception.
+    """
+    def __init__(self, name, attributes):
+        parent = _current_span.get()
+        self.name = name
+        self.id = next(_span_ids)
+        self.parent_id = parent.id if parent else None
+        self.trace_id = parent.trace_id if parent else self.id
+        self.attributes = dict(attributes)
+        self.outcome = "ok"
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.started
+        if exc_type is not None and self.outcome == "ok":
+            self.outcome = exception_outcome(exc_type)
+            self.attributes.setdefault("error", str(exc)[:200])
+        _current_span.reset(self.token)
+        record_span(self)
+        return False
+
+    def to_dict(self):
+        return {"name" : self.name, "span_id" : self.id, "parent_id" : self.parent_id, "trace_id" : self.trace_id,
+                "start" : self.start, "seconds" : self.seconds, "outcome" : self.outcome, **self.attributes}
+
+def span(name, **attributes):
+    """
+    Context manager timing a block as a child of the current span: with span("retrieval", k=4) as s: ...
+    """
+    return Span(name, attributes)
+
+def current_span():
+    return _current_span.get()
+
+def exception_outcome(exc_type):
+    if issubclass(exc_type, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    if issubclass(exc_type, asyncio.CancelledError):
+        return "cancelled"
+    if issubclass(exc_type, ValueError):
+        return "parse_error"
+    return "error"
+
+def token_counts(result, prompt):
+    """
+    (input, output) tokens of an LLM call: the provider's usage when it reports it (OpenAI),
+    otherwise estimated from the text (Ollama returns plain strings).
+    - prompt: callable returning the prompt, only called when the tokens have to be estimated.
+    """
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    prompt = prompt()
+    prompt_text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+    return estimate_tokens(prompt_text), estimate_tokens(str(getattr(result, "content", result)))
+
+def record_span(s):
+    model = s.attributes.get("model", "")
+    key = (s.name, model, s.outcome)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets" : [0] * (len(TRACE_BUCKETS) + 1), "count" : 0, "sum" : 0.0,
+                                            "recent" : deque(maxlen=1000)}
+        histogram["buckets"][bisect.bisect_left(TRACE_BUCKETS, s.seconds)] += 1
+        histogram["count"] += 1
+        histogram["sum"] += s.seconds
+        histogram["recent"].append(s.seconds)
+        for direction in ("in", "out"):
+            if f"tokens_{direction}" in s.attributes:
+                _tokens[(model, direction)] = _tokens.get((model, direction), 0) + s.attributes[f"tokens_{direction}"]
+        finished_spans.append(s.to_dict())
+        listeners = list(_span_listeners)
+    for listener in listeners:
+        listener(s)
+
+def reset_metrics():
+    with _lock:
+        _histograms.clear()
+        _tokens.clear()
+        finished_spans.clear()
+
+def metrics_json():
+    """
+    Per (span, model, outcome): count, mean, p50, p95 and p99 seconds over the recent spans; tokens per model.
+    """
+    with _lock:
+        spans = []
+        for (name, model, outcome), h in sorted(_histograms.items()):
+            recent = np.asarray(h["recent"])
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if len(recent) else (0.0, 0.0, 0.0)
+            spans.append({"span" : name, "model" : model, "outcome" : outcome, "count" : h["count"],
+                          "mean_seconds" : h["sum"] / h["count"], "p50_seconds" : p50, "p95_seconds" : p95, "p99_seconds" : p99})
+        tokens = [{"model" : model, "direction" : direction, "tokens" : count} for (model, direction), count in sorted(_tokens.items())]
+    return {"spans" : spans, "tokens" : tokens}
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def label_text(**labels):
+    return ",".join(f'{k}="{label_value(v)}"' for k, v in labels.items())
+
+def metrics_text():
+    """
+    The metrics in the Prometheus text exposition format.
+    """
+    lines = ["# HELP ai_council_span_seconds Duration of council spans.", "# TYPE ai_council_span_seconds histogram"]
+    with _lock:
+        for (name, model, outcome), h in sorted(_histograms.items()):
+            labels = label_text(span=name, model=model, outcome=outcome)
+            cumulative = 0
+            for bound, count in zip(TRACE_BUCKETS + [float("inf")], h["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'ai_council_span_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"ai_council_span_seconds_sum{{{labels}}} {h['sum']}")
+            lines.append(f"ai_council_span_seconds_count{{{labels}}} {h['count']}")
+        lines += ["# HELP ai_council_tokens_total LLM tokens by model and direction.", "# TYPE ai_council_tokens_total counter"]
+        for (model, direction), count in sorted(_tokens.items()):
+            lines.append(f"ai_council_tokens_total{{{label_text(model=model, direction=direction)}}} {count}")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(metrics_json(), default=float).encode(), "application/json"
+        elif self.path.startswith("/spans"):
+            body, content_type = json.dumps(list(finished_spans), default=str).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = metrics_text().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_metrics(port=9464, host="127.0.0.1"):
+    """
+    Serves /metrics (Prometheus), /metrics.json and /spans (recent spans) from a daemon thread.
+    Returns the server; call shutdown() on it to stop.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="ai-council-metrics", daemon=True).start()
+    return server
+
+def add_log_listener(listener):
+    """
+    Sends log events to listener(level, message, span) instead of stdout.
+    """
+    with _lock:
+        _log_listeners.append(listener)
+
+def remove_log_listener(listener):
+    with _lock:
+        if listener in _log_listeners:
+            _log_listeners.remove(listener)
+
+def add_span_listener(listener):
+    with _lock:
+        _span_listeners.append(listener)
+
+def remove_span_listener(listener):
+    with _lock:
+        if listener in _span_listeners:
+            _span_listeners.remove(listener)
+
+def log(message, level="INFO"):
+    """
+    Emits a log event to the registered listeners, or prints it when there are none.
+    The current span is passed along so listeners can tell concurrent questions apart.
+    """
+    with _lock:
+        listeners = list(_log_listeners)
+    if not listeners:
+        print(message)
+        return
+    s = _current_span.get()
+    for listener in listeners:
+        listener(level, str(message), s)
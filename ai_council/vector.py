@@ -1,12 +1,244 @@
-from langchain_ollama import OllamaEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.base import Docstore, AddableMixin
 from langchain_core.documents import Document
 import os
-import pandas as pd
-from pypdf import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import re
+import json
+from collections.abc import MutableMapping
+from collections import deque
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import hashlib
+import sqlite3
+import threading
+from array import array
+import numpy as np
+import faiss
 from ai_council.constants import *
-from langchain_openai import OpenAIEmbeddings
+from ai_council.tracing import span, log
+from langchain_core.embeddings import Embeddings
+
+###############################################################################
+# Name : CachedEmbeddings
+# Function : Embeddings wrapper with an on-disk cache keyed by (model, text hash)
+#            so unchanged chunks and repeated queries are never embedded twice
+# Returns : embeddings usable anywhere a LangChain Embeddings is expected
+###############################################################################
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying, model, path=EMBEDDING_CACHE_PATH):
+        self.underlying = underlying
+        self.model = model
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT, kind TEXT, hash TEXT, vector BLOB, "
+                          "PRIMARY KEY (model, kind, hash))")
+        self.conn.commit()
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _lookup(self, kind, hashes):
+        found = {}
+        with self.lock:
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND kind = ? AND hash IN ({','.join('?' * len(batch))})",
+                    [self.model, kind, *batch])
+                for h, blob in rows:
+                    found[h] = array('f', blob).tolist()
+        return found
+
+    def _store(self, kind, items):
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                                  [(self.model, kind, h, array('f', v).tobytes()) for h, v in items])
+            self.conn.commit()
+
+    def _missing(self, kind, texts):
+        hashes = [self.text_hash(t) for t in texts]
+        found = self._lookup(kind, list(set(hashes)))
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in found:
+                missing[h] = t
+        return hashes, found, missing
+
+    def embed_documents(self, texts):
+        hashes, found, missing = self._missing("document", texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new = list(zip(missing.keys(), vectors))
+            self._store("document", new)
+            found.update(new)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        hashes, found, missing = self._missing("query", [text])
+        if missing:
+            found[hashes[0]] = self.underlying.embed_query(text)
+            self._store("query", [(hashes[0], found[hashes[0]])])
+        return found[hashes[0]]
+
+    async def aembed_documents(self, texts):
+        hashes, found, missing = self._missing("document", texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            new = list(zip(missing.keys(), vectors))
+            self._store("document", new)
+            found.update(new)
+        return [found[h] for h in hashes]
+
+    async def aembed_query(self, text):
+        hashes, found, missing = self._missing("query", [text])
+        if missing:
+            found[hashes[0]] = await self.underlying.aembed_query(text)
+            self._store("query", [(hashes[0], found[hashes[0]])])
+        return found[hashes[0]]
+
+###############################################################################
+# Name : SQLiteDocstore
+# Function : LangChain docstore backed by an indexed SQLite table, so chunk
+#            text and metadata are read per query hit instead of unpickled up
+#            front. Also holds the FAISS position -> chunk id table and an FTS5
+#            (BM25) index of the chunk text kept in step with the chunks.
+#            Writes stay in an open transaction until commit()
+# Returns : docstore usable by the LangChain FAISS store
+###############################################################################
+class SQLiteDocstore(Docstore, AddableMixin):
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.lock = threading.Lock()
+        uri = f"file:{path}?mode=ro" if read_only else f"file:{path}"
+        self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        if not read_only:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS chunks (rowid INTEGER PRIMARY KEY, doc_id TEXT UNIQUE, content TEXT, metadata TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, doc_id TEXT)")
+            # Shares rowids with chunks; porter stemming so defined terms match their inflections
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(content, tokenize='porter unicode61')")
+
+    def search(self, search):
+        with self.lock:
+            row = self.conn.execute("SELECT content, metadata FROM chunks WHERE doc_id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts):
+        ids = list(texts)
+        with self.lock:
+            try:
+                self.conn.executemany("INSERT INTO chunks (doc_id, content, metadata) VALUES (?, ?, ?)",
+                                      [(k, d.page_content, json.dumps(d.metadata)) for k, d in texts.items()])
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"Tried to add ids that already exist: {e}")
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                self.conn.execute("INSERT INTO chunks_fts (rowid, content) SELECT rowid, content FROM chunks "
+                                  f"WHERE doc_id IN ({','.join('?' * len(batch))})", batch)
+
+    def delete(self, ids):
+        with self.lock:
+            self.conn.executemany("DELETE FROM chunks_fts WHERE rowid IN (SELECT rowid FROM chunks WHERE doc_id = ?)",
+                                  [(i,) for i in ids])
+            self.conn.executemany("DELETE FROM chunks WHERE doc_id = ?", [(i,) for i in ids])
+
+    def lexical_search(self, query, k=4):
+        """BM25 search over the chunk text, best first. Returns (doc_id, bm25) pairs."""
+        # Every word becomes a quoted FTS phrase so punctuation in the question
+        # (clause numbers like 4.2, hyphens, quotes) can never break the query syntax
+        terms = re.findall(r"\w+(?:[.\-/]\w+)*", query)
+        if not terms:
+            return []
+        match = " OR ".join('"' + term + '"' for term in terms)
+        with self.lock:
+            return self.conn.execute(
+                "SELECT chunks.doc_id, bm25(chunks_fts) FROM chunks_fts JOIN chunks ON chunks.rowid = chunks_fts.rowid "
+                "WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts) LIMIT ?", (match, k)).fetchall()
+
+    def write_positions(self, index_to_docstore_id):
+        items = list(index_to_docstore_id.items())
+        with self.lock:
+            self.conn.execute("DELETE FROM positions")
+            self.conn.executemany("INSERT INTO positions VALUES (?, ?)", [(int(i), d) for i, d in items])
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+###############################################################################
+# Name : SQLiteIdMap
+# Function : The FAISS position -> chunk id mapping of a SQLiteDocstore as a
+#            dict-like object, looked up per query hit
+# Returns : mapping usable as index_to_docstore_id
+###############################################################################
+class SQLiteIdMap(MutableMapping):
+    def __init__(self, docstore):
+        self.docstore = docstore
+
+    def _query(self, sql, params=()):
+        with self.docstore.lock:
+            return self.docstore.conn.execute(sql, params).fetchall()
+
+    def __getitem__(self, position):
+        rows = self._query("SELECT doc_id FROM positions WHERE position = ?", (int(position),))
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def __setitem__(self, position, doc_id):
+        self._query("INSERT OR REPLACE INTO positions VALUES (?, ?)", (int(position), doc_id))
+
+    def __delitem__(self, position):
+        self[position]
+        self._query("DELETE FROM positions WHERE position = ?", (int(position),))
+
+    def __iter__(self):
+        return iter([row[0] for row in self._query("SELECT position FROM positions ORDER BY position")])
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM positions")[0][0]
+
+    def items(self):
+        return self._query("SELECT position, doc_id FROM positions ORDER BY position")
+
+    def values(self):
+        return [row[1] for row in self.items()]
+
+    def update(self, other=(), **kwargs):
+        with self.docstore.lock:
+            self.docstore.conn.executemany("INSERT OR REPLACE INTO positions VALUES (?, ?)",
+                                           [(int(i), d) for i, d in dict(other, **kwargs).items()])
+
+###############################################################################
+# Name : get_embeddings
+# Function : Builds the embeddings client for the active mode behind the cache
+# Returns : CachedEmbeddings
+###############################################################################
+def get_embeddings():
+    if FAKE_MODELS:
+        from ai_council.fake_llm import FakeEmbeddings
+        fake = FakeEmbeddings()
+        return CachedEmbeddings(fake, fake.model, path=":memory:")
+    # The backend packages are slow to import, so only the active one is, and only here
+    if IS_ONLINE:
+        from langchain_openai import OpenAIEmbeddings
+        return CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"), "text-embedding-3-small")
+    from langchain_ollama import OllamaEmbeddings
+    return CachedEmbeddings(OllamaEmbeddings(model="mxbai-embed-large"), "mxbai-embed-large")
+
+###############################################################################
+# Name : embedding_config
+# Function : Embedding model and dimension a db is built with, recorded in the
+#            manifest. The dimension comes from a probe query, embedded once
+#            per model thanks to the embedding cache
+# Returns : dict
+###############################################################################
+def embedding_config(embeddings):
+    return {"model" : embeddings.model, "dim" : len(embeddings.embed_query("embedding dimension probe"))}
 
 ###############################################################################
 # Name : check_files_folders
@@ -15,23 +247,55 @@ from langchain_openai import OpenAIEmbeddings
 ###############################################################################
 def check_files_folders():
     files = os.listdir(DATA_DOC_FOLDER)
+    os.makedirs(VECTOR_DB_FOLDER, exist_ok=True)
     vectors = True if len(os.listdir(VECTOR_DB_FOLDER)) else False
     return files, vectors
 
 ###############################################################################
 # Name : get_vector_db
-# Function : Retreives the db or creates a db if outdates 
+# Function : Retreives the db, applying incremental updates for added, modified
+#            and deleted documents, or creates a db if there is none
 # Returns : vector stores
 ###############################################################################
 def get_vector_db():
-    if verify_file_vectorisation():
-        embeddings = OllamaEmbeddings(model="mxbai-embed-large") if not IS_ONLINE else OpenAIEmbeddings(model="text-embedding-3-small")
-        vs = FAISS.load_local(VECTOR_DB_FOLDER, embeddings=embeddings, allow_dangerous_deserialization=True)
-        return vs
-    else:
-        print("Creating the vector DB")
-        vs = create_vector_db()
-        return vs
+    files, vectors = check_files_folders()
+    manifest = load_manifest()
+    if not vectors or manifest is None or manifest.get("format") != VECTOR_DB_FORMAT:
+        # No index, or one from an older layout (no chunk ids, pickled docstore)
+        log("Creating the vector DB")
+        create_vector_db()
+    elif manifest.get("index") != index_build_config():
+        log("Vector index settings changed, creating the vector DB")
+        create_vector_db()
+    elif manifest.get("embeddings") != embedding_config(get_embeddings()):
+        # Vectors of another model (or dimension) cannot be searched with this one's queries
+        log(f"Embedding model changed from {manifest.get('embeddings')}, creating the vector DB")
+        create_vector_db()
+    elif documents_changed(manifest):
+        vs = load_vector_db(get_embeddings(), read_only=False)
+        try:
+            update_vector_db(vs, manifest)
+        except NotImplementedError as e:
+            log(f"{e}, creating the vector DB")
+            create_vector_db()
+    # Whatever was built or updated, serve queries from the memory-mapped copy on disk
+    return load_vector_db(get_embeddings())
+
+###############################################################################
+# Name : load_vector_db
+# Function : Opens the saved db. Read-only, the index is memory-mapped (pages
+#            shared by every process serving from it) and chunk text is only
+#            read from SQLite for the hits of a query. A read-only db must not
+#            be added to: FAISS aborts the process on writes to a mapped index
+# Returns : vector stores
+###############################################################################
+def load_vector_db(embeddings, read_only=True):
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY if read_only else 0
+    with span("vector_db_load", read_only=read_only):
+        index = faiss.read_index(VECTOR_INDEX_PATH, flags)
+        set_search_params(index)
+        docstore = SQLiteDocstore(VECTOR_DOCSTORE_PATH, read_only=read_only)
+    return FAISS(embedding_function=embeddings, index=index, docstore=docstore, index_to_docstore_id=SQLiteIdMap(docstore))
 
 ###############################################################################
 # Name : create_vector_db
@@ -40,47 +304,486 @@ def get_vector_db():
 ###############################################################################
 def create_vector_db():
     files, vectors = check_files_folders()
-    documents = [DATA_DOC_FOLDER+"/"+k for k in files]
+    manifest = {"files" : {}, "index" : index_build_config(), "embeddings" : embedding_config(get_embeddings()),
+                "format" : VECTOR_DB_FORMAT}
+    # A crash mid-build must not leave an old manifest next to a half-written db
+    for name in ("manifest.json", "docstore.sqlite", "index.pkl"):
+        if os.path.exists(VECTOR_DB_FOLDER+"/"+name):
+            os.remove(VECTOR_DB_FOLDER+"/"+name)
+    signatures = {name : file_signature(DATA_DOC_FOLDER+"/"+name) for name in files}
+    progress = IngestProgress(sum(sig["size"] for sig in signatures.values()))
+    vs = index_chunk_batches(None, iter_chunk_batches(signatures, manifest, progress=progress), progress)
+    if vs is None:
+        raise ValueError(f"No indexable pages found in {DATA_DOC_FOLDER}")
+    log(f"Created {vs.index.ntotal} chunks")
+    save_vector_db(vs, manifest)
+    return vs
+
+###############################################################################
+# Name : documents_changed
+# Function : Cheap check of the Docs folder against the manifest (names, sizes
+#            and mtimes only)
+# Returns : Boolean that flags whether update_vector_db has anything to do
+###############################################################################
+def documents_changed(manifest):
+    files, vectors = check_files_folders()
+    if sorted(files) != sorted(manifest["files"]):
+        return True
+    for name in files:
+        signature = file_signature(DATA_DOC_FOLDER+"/"+name, with_hash=False)
+        entry = manifest["files"][name]
+        if entry["size"] != signature["size"] or entry["mtime"] != signature["mtime"]:
+            return True
+    return False
+
+###############################################################################
+# Name : update_vector_db
+# Function : Brings a loaded db in line with the Docs folder using the manifest.
+#            Deleted files drop their chunks, new and modified files are chunked
+#            and added; files whose size and mtime match are not even re-hashed
+# Returns : Boolean that flags whether anything changed
+###############################################################################
+def update_vector_db(vs, manifest):
+    files, vectors = check_files_folders()
+    index_changed = manifest_changed = False
+
+    for name in sorted(set(manifest["files"]) - set(files)):
+        log(f"Removing {name} from the vector DB")
+        remove_chunks(vs, manifest["files"].pop(name)["chunk_ids"])
+        index_changed = True
+
+    signatures = {}
+    for name in files:
+        document = DATA_DOC_FOLDER+"/"+name
+        entry = manifest["files"].get(name)
+        signature = file_signature(document, with_hash=False)
+        if entry and entry["size"] == signature["size"] and entry["mtime"] == signature["mtime"]:
+            continue
+        signature["sha256"] = file_hash(document)
+        if entry and entry["sha256"] == signature["sha256"]:
+            # Touched but not edited
+            entry.update(signature)
+            manifest_changed = True
+            continue
+        log(f"{'Re-indexing' if entry else 'Indexing'} {name}")
+        if entry:
+            remove_chunks(vs, entry["chunk_ids"])
+        signatures[name] = signature
+
+    if signatures:
+        progress = IngestProgress(sum(sig["size"] for sig in signatures.values()))
+        index_chunk_batches(vs, iter_chunk_batches(signatures, manifest, progress=progress), progress)
+        index_changed = True
+
+    if index_changed:
+        save_vector_db(vs, manifest)
+    elif manifest_changed:
+        save_manifest(manifest)
+    return index_changed
+
+###############################################################################
+# Name : save_vector_db
+# Function : Saves the index, commits the docstore, then writes the manifest
+#            and the list of vectorised files
+# Returns : None
+###############################################################################
+def save_vector_db(vs, manifest):
+    faiss.write_index(vs.index, VECTOR_INDEX_PATH + ".tmp")
+    vs.docstore.write_positions(vs.index_to_docstore_id)
+    vs.docstore.commit()
+    os.replace(VECTOR_INDEX_PATH + ".tmp", VECTOR_INDEX_PATH)
+    save_manifest(manifest)
+    import pandas as pd
+    files_pd = pd.DataFrame(sorted(manifest["files"]))
+    files_pd.to_csv('ai_council/Vectorised_files.csv', index=False)
+
+###############################################################################
+# Name : remove_chunks
+# Function : Deletes chunks from the db by id. Raises NotImplementedError for
+#            index types that cannot delete, so the caller can rebuild instead
+# Returns : None
+###############################################################################
+def remove_chunks(vs, chunk_ids):
+    if not chunk_ids:
+        return
+    index = faiss.downcast_index(vs.index)
+    if isinstance(index, faiss.IndexHNSW):
+        raise NotImplementedError("HNSW indexes cannot delete vectors")
+    if not isinstance(index, faiss.IndexIVF):
+        vs.delete(chunk_ids)
+        return
+    # IVF removal keeps the ids of the surviving vectors, but LangChain renumbers
+    # its id map 0..n-1 as a flat index would; renumber the inverted lists to match
+    positions = {doc_id : i for i, doc_id in vs.index_to_docstore_id.items()}
+    keep = np.ones(index.ntotal, dtype=bool)
+    keep[[positions[chunk_id] for chunk_id in chunk_ids]] = False
+    remap = np.cumsum(keep) - 1
+    vs.delete(chunk_ids)
+    for list_no in range(index.nlist):
+        size = index.invlists.list_size(list_no)
+        if size:
+            ids = faiss.rev_swig_ptr(index.invlists.get_ids(list_no), size)
+            ids[:] = remap[ids]
+
+###############################################################################
+# Name : extract_page_range
+# Function : Ingestion worker: reads pages [start, stop) of one PDF, skipping
+#            short pages and tables of contents. Runs in a separate process
+# Returns : list of (text, page number)
+###############################################################################
+def extract_page_range(document, start, stop):
+    from pypdf import PdfReader
     pages = []
-    vectorised_documents = []
-
-    for document in documents:
-        reader = PdfReader(document)
-        for i, page in enumerate(reader.pages, start=1):
-            txt = (page.extract_text() or "").strip()
-            if len(txt.split()) < 50 or "table of contents" in txt.lower():
-                continue
-            pages.append({"text": txt, "source": document, "page": i})
-        vectorised_documents.append(document)
-
-    docs = [Document(page_content=p["text"], metadata={"source": p["source"], "page": p["page"]})
-        for p in pages]
+    reader = PdfReader(document)
+    for i in range(start, stop):
+        txt = (reader.pages[i].extract_text() or "").strip()
+        if len(txt.split()) < 50 or "table of contents" in txt.lower():
+            continue
+        pages.append((txt, i + 1))
+    return pages
+
+###############################################################################
+# Name : extract_pages
+# Function : Reads one whole PDF in the current process
+# Returns : list of Documents, one per kept page
+###############################################################################
+def extract_pages(document):
+    from pypdf import PdfReader
+    return [Document(page_content=txt, metadata={"source": document, "page": page})
+            for txt, page in extract_page_range(document, 0, len(PdfReader(document).pages))]
+
+###############################################################################
+# Name : iter_document_pages
+# Function : Streams documents through a process pool in page ranges, keeping
+#            only a couple of ranges per worker in flight so memory stays
+#            bounded, and yields each document as soon as its ranges are done
+# Returns : generator of (document, list of page Documents), in input order
+###############################################################################
+def iter_document_pages(documents, workers=INGEST_WORKERS, pages_per_task=INGEST_PAGES_PER_TASK):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for document in documents:
+            yield document, extract_pages(document)
+        return
+
+    def page_ranges():
+        from pypdf import PdfReader
+        for document in documents:
+            n = len(PdfReader(document).pages)
+            for start in range(0, max(n, 1), pages_per_task):
+                yield document, start, min(start + pages_per_task, n), start + pages_per_task >= n
+
+    ranges = page_ranges()
+    window = deque()
+    pages = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def fill():
+            while len(window) < 2 * workers:
+                task = next(ranges, None)
+                if task is None:
+                    return
+                window.append((task, pool.submit(extract_page_range, *task[:3])))
+
+        fill()
+        while window:
+            (document, start, stop, last), future = window.popleft()
+            pages += [Document(page_content=txt, metadata={"source": document, "page": page})
+                      for txt, page in future.result()]
+            fill()
+            if last:
+                yield document, pages
+                pages = []
+
+###############################################################################
+# Name : chunk_pages
+# Function : Chunks one document's pages and gives every chunk an id derived
+#            from the file name and content hash, so the manifest can delete
+#            them later
+# Returns : list of chunk ids and list of chunks
+###############################################################################
+def chunk_pages(document, pages, sha256):
     # Chunking (keep it modest so it’s fast)
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
-    chunks = splitter.split_documents(docs)
-    print(f"Created {len(chunks)} chunks")
-    embeddings = OllamaEmbeddings(model="mxbai-embed-large") if not IS_ONLINE else OpenAIEmbeddings(model="text-embedding-3-small")
-    vs = FAISS.from_texts(
-        texts=[c.page_content for c in chunks],
-        embedding=embeddings,
-        metadatas=[c.metadata for c in chunks],
-    )
-    vs.save_local(VECTOR_DB_FOLDER)
-    files_pd = pd.DataFrame(files)
-    files_pd.to_csv('ai_council/Vectorised_files.csv', index=False)
+    chunks = splitter.split_documents(pages)
+    chunk_ids = [f"{os.path.basename(document)}:{sha256[:16]}:{n}" for n in range(len(chunks))]
+    return chunk_ids, chunks
+
+###############################################################################
+# Name : iter_chunk_batches
+# Function : Streams the given files through extraction and chunking, records
+#            them in the manifest, and regroups their chunks into embedding
+#            batches that may span files
+# Returns : generator of lists of (chunk id, chunk)
+###############################################################################
+def iter_chunk_batches(signatures, manifest, batch_size=None, progress=None):
+    batch_size = batch_size or embedding_settings()["batch_size"]
+    batch = []
+    for document, pages in iter_document_pages([DATA_DOC_FOLDER+"/"+name for name in signatures]):
+        name = os.path.basename(document)
+        chunk_ids, chunks = chunk_pages(document, pages, signatures[name]["sha256"])
+        manifest["files"][name] = {**signatures[name], "chunk_ids" : chunk_ids}
+        if progress:
+            progress.document_chunked(signatures[name]["size"], len(chunks))
+        batch += zip(chunk_ids, chunks)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+###############################################################################
+# Name : embedding_settings
+# Function : Embedding batch size and concurrency for the active backend
+# Returns : dict with batch_size and concurrency
+###############################################################################
+def embedding_settings():
+    return EMBEDDING_BATCHING["openai" if IS_ONLINE else "ollama"]
+
+###############################################################################
+# Name : embed_with_retries
+# Function : Embeds one batch, retrying with exponential backoff so a failed
+#            batch does not restart the whole job
+# Returns : list of vectors
+###############################################################################
+def embed_with_retries(embeddings, texts, retries=EMBED_RETRIES):
+    for attempt in range(retries):
+        try:
+            with span("embed_batch", model=getattr(embeddings, "model", ""), size=len(texts), attempt=attempt):
+                return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            log(f"Embedding batch of {len(texts)} failed ({e}), retrying in {2 ** attempt}s", "WARNING")
+            time.sleep(2 ** attempt)
+
+###############################################################################
+# Name : IngestProgress
+# Function : Tracks embedded chunks and reports throughput and ETA. The total
+#            chunk count is not known while streaming, so it is extrapolated
+#            from the chunks per input byte of the documents chunked so far
+# Returns : None
+###############################################################################
+class IngestProgress:
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.bytes_chunked = 0
+        self.chunks_created = 0
+        self.chunks_embedded = 0
+        self.started = self.last_report = time.monotonic()
+
+    def document_chunked(self, size, n_chunks):
+        self.bytes_chunked += size
+        self.chunks_created += n_chunks
+
+    def batch_embedded(self, n_chunks):
+        self.chunks_embedded += n_chunks
+        now = time.monotonic()
+        if now - self.last_report >= EMBED_REPORT_SECONDS:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.chunks_embedded / elapsed if elapsed else 0.0
+        expected = self.chunks_created * self.total_bytes / self.bytes_chunked if self.bytes_chunked else 0
+        eta = f"{max(expected - self.chunks_embedded, 0) / rate:.0f}s" if rate else "unknown"
+        log(f"Embedded {self.chunks_embedded} chunks, {rate:.1f} chunks/s, ETA {eta}")
+
+###############################################################################
+# Name : index_build_config
+# Function : The VECTOR_INDEX settings that shape the saved index for its type
+#            (query-time settings excluded), recorded in the manifest
+# Returns : dict
+###############################################################################
+def index_build_config(config=VECTOR_INDEX):
+    keys = {
+        "flat" : [],
+        "ivf_flat" : ["nlist"],
+        "hnsw" : ["hnsw_m", "ef_construction"],
+        "ivf_pq" : ["nlist", "pq_m", "pq_bits"]
+    }
+    if config["type"] not in keys:
+        raise ValueError(f"Unknown vector index type {config['type']}")
+    return {"type" : config["type"], **{k : config[k] for k in keys[config["type"]]}}
+
+###############################################################################
+# Name : training_size
+# Function : Vectors to collect before building the index, following the FAISS
+#            guideline of ~39 training points per centroid
+# Returns : int
+###############################################################################
+def training_size(config=VECTOR_INDEX):
+    if config["type"] in ("flat", "hnsw"):
+        return 1
+    if config["type"] == "ivf_pq":
+        return 39 * max(config["nlist"], 2 ** config["pq_bits"])
+    return 39 * config["nlist"]
+
+###############################################################################
+# Name : build_faiss_index
+# Function : Creates an empty FAISS index of the configured type, trained on
+#            the given vectors when the type needs it. nlist and pq_bits are
+#            reduced when there are too few vectors to train them
+# Returns : faiss index
+###############################################################################
+def build_faiss_index(vectors, config=VECTOR_INDEX):
+    vectors = np.asarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    if config["type"] == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif config["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config["hnsw_m"])
+        index.hnsw.efConstruction = config["ef_construction"]
+    else:
+        nlist = max(1, min(config["nlist"], n // 39))
+        if config["type"] == "ivf_flat":
+            index = faiss.index_factory(dim, f"IVF{nlist},Flat")
+        elif config["type"] == "ivf_pq":
+            bits = max(1, min(config["pq_bits"], int(np.log2(n))))
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{config['pq_m']}x{bits}")
+        else:
+            raise ValueError(f"Unknown vector index type {config['type']}")
+        index.train(vectors)
+    set_search_params(index, config)
+    return index
+
+###############################################################################
+# Name : set_search_params
+# Function : Applies the query-time settings (nprobe, efSearch) to an index
+# Returns : None
+###############################################################################
+def set_search_params(index, config=VECTOR_INDEX):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config["ef_search"]
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = config["nprobe"]
+
+###############################################################################
+# Name : new_vector_store
+# Function : Empty LangChain FAISS store around a freshly built index, with its
+#            chunks written to the SQLite docstore
+# Returns : vector stores
+###############################################################################
+def new_vector_store(embeddings, training_vectors, config=VECTOR_INDEX, docstore_path=VECTOR_DOCSTORE_PATH):
+    index = build_faiss_index(training_vectors, config)
+    docstore = SQLiteDocstore(docstore_path)
+    return FAISS(embedding_function=embeddings, index=index, docstore=docstore, index_to_docstore_id=SQLiteIdMap(docstore))
+
+###############################################################################
+# Name : index_chunk_batches
+# Function : Embeds chunk batches with a bounded number of concurrent requests
+#            and adds them to the db in order, creating it from the first batch
+#            when vs is None
+# Returns : vector stores (None if there were no chunks)
+###############################################################################
+def index_chunk_batches(vs, batches, progress=None):
+    embeddings = get_embeddings()
+    concurrency = embedding_settings()["concurrency"]
+    window = deque()
+    untrained = []      # embedded batches held back until there are enough vectors to train a new index
+
+    def add_oldest(vs):
+        batch, future = window.popleft()
+        vectors = future.result()
+        text_embeddings = [(chunk.page_content, vector) for (_, chunk), vector in zip(batch, vectors)]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        ids = [chunk_id for chunk_id, _ in batch]
+        if vs is None:
+            untrained.append((text_embeddings, metadatas, ids))
+            if sum(len(item[2]) for item in untrained) >= training_size():
+                vs = flush_untrained()
+        else:
+            vs.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        if progress:
+            progress.batch_embedded(len(batch))
+        return vs
+
+    def flush_untrained():
+        vs = new_vector_store(embeddings, [vector for item in untrained for _, vector in item[0]])
+        for text_embeddings, metadatas, ids in untrained:
+            vs.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        untrained.clear()
+        return vs
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for batch in batches:
+            window.append((batch, pool.submit(embed_with_retries, embeddings, [chunk.page_content for _, chunk in batch])))
+            if len(window) >= 2 * concurrency:
+                vs = add_oldest(vs)
+        while window:
+            vs = add_oldest(vs)
+    if vs is None and untrained:
+        vs = flush_untrained()
+    if progress:
+        progress.report()
     return vs
 
+###############################################################################
+# Name : file_hash / file_signature
+# Function : Content hash, and size + mtime (+ hash) of one document
+# Returns : hex digest / dict
+###############################################################################
+def file_hash(document):
+    digest = hashlib.sha256()
+    with open(document, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_signature(document, with_hash=True):
+    stat = os.stat(document)
+    signature = {"size" : stat.st_size, "mtime" : stat.st_mtime_ns}
+    if with_hash:
+        signature["sha256"] = file_hash(document)
+    return signature
+
+###############################################################################
+# Name : load_manifest / save_manifest
+# Function : Reads and writes the per-file manifest of the vector db
+#            {"files": {name: {size, mtime, sha256, chunk_ids}}}
+# Returns : manifest dict (None if there is none) / None
+###############################################################################
+def load_manifest():
+    try:
+        with open(VECTOR_MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_manifest(manifest):
+    with open(VECTOR_MANIFEST_PATH + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(VECTOR_MANIFEST_PATH + ".tmp", VECTOR_MANIFEST_PATH)
+
 ###############################################################################
 # Name : verify_file_vectorisation
-# Function : Checks if all the files have been vectorised
+# Function : Checks if all the files have been vectorised, unchanged
 # Returns : Boolean that flags non existent or outdated vectors
 ###############################################################################
 def verify_file_vectorisation():
     try:
         files, vectors = check_files_folders()
-        vectoried_files = pd.read_csv('ai_council/Vectorised_files.csv').to_numpy()
-        same_files = sorted(files) == sorted(vectoried_files)
-        return same_files and vectors
+        manifest = load_manifest()
+        if not vectors or manifest is None or sorted(files) != sorted(manifest["files"]):
+            return False
+        return all(manifest["files"][name]["sha256"] == file_hash(DATA_DOC_FOLDER+"/"+name) for name in files)
     except Exception as e:
-        print(e)
-        return False
\ No newline at end of file
+        log(str(e), "ERROR")
+        return False
+
+###############################################################################
+# Name : vector_db_fingerprint
+# Function : Identifies the saved vector db by the size and mtime of its files
+# Returns : hex digest that changes whenever the db is rebuilt
+###############################################################################
+def vector_db_fingerprint():
+    digest = hashlib.sha256()
+    if os.path.isdir(VECTOR_DB_FOLDER):
+        for name in sorted(os.listdir(VECTOR_DB_FOLDER)):
+            path = os.path.join(VECTOR_DB_FOLDER, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
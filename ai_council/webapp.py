@@ -4,8 +4,8 @@ warnings.filterwarnings('ignore')
 import ipywidgets as widgets
 from IPython.display import display, clear_output, HTML
 import threading
-import sys
-from io import StringIO
+import asyncio
+from collections import deque
 from datetime import datetime
 import time
 
@@ -14,12 +14,26 @@ from ai_council.prompts import *
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from ai_council.vector import *
+from ai_council.cache import CouncilCache
+from ai_council.tracing import add_log_listener
 
 class AICouncilUI:
     def __init__(self):
         self.vs = None
-        self.is_processing = False
-        self.logs = []
+        self.cache = None
+        self.in_flight = 0
+        self.in_flight_lock = threading.Lock()
+        self.logs = deque(maxlen=UI_LOG_RETENTION)
+        self.chat_window = UI_CHAT_WINDOW
+        
+        # Panels are re-rendered by a timer at most UI_FRAME_RATE times a second, not on every update
+        self.render_lock = threading.Lock()
+        self.dirty = set()
+        self.render_timer = None
+        self.last_render = 0.0
+        
+        # Council log events (retries, timeouts, parse failures) go to the log panel, not stdout
+        add_log_listener(lambda level, message, span: self.add_log(level, message))
         
         # Create UI components
         self.create_ui()
@@ -43,6 +57,13 @@ class AICouncilUI:
             }])
         )
         
+        # Only the last chat_window messages are rendered; this loads earlier ones
+        self.earlier_button = widgets.Button(
+            description='Show earlier messages',
+            layout=widgets.Layout(width='100%', display='none')
+        )
+        self.earlier_button.on_click(self.on_earlier_clicked)
+        
         # Log display area
         self.log_html = widgets.HTML(
             value=self._render_logs([])
@@ -71,6 +92,7 @@ class AICouncilUI:
         
         chat_section = widgets.VBox([
             widgets.HTML('<h3 style="margin: 10px 0; color: #667eea;">💬 Chat</h3>'),
+            self.earlier_button,
             self.chat_html,
             input_box
         ], layout=widgets.Layout(width='65%'))  # Chat takes 65% of width
@@ -123,36 +145,61 @@ class AICouncilUI:
         '''
     
     def _render_chat(self, messages):
-        """Render chat messages"""
+        """Render the last chat_window chat messages; finished messages are rendered once and cached"""
         html = '<div style="height: 400px; overflow-y: auto; border: 2px solid #e0e0e0; border-radius: 10px; padding: 10px; background: white;">'
         
-        for msg in messages:
-            if msg['type'] == 'user':
-                html += f'''
-                    <div style="display: flex; justify-content: flex-end; margin: 10px 0;">
-                        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                                    color: white; padding: 12px 16px; border-radius: 18px; 
-                                    max-width: 70%; word-wrap: break-word;">
-                            {self._escape_html(msg['text'])}
-                        </div>
+        hidden = max(0, len(messages) - self.chat_window)
+        if hidden:
+            html += f'<div style="text-align: center; color: #888; font-size: 12px; margin: 5px 0;">{hidden} earlier message(s) not shown</div>'
+        
+        for msg in messages[hidden:]:
+            html += self._render_message(msg)
+        
+        html += '</div>'
+        return html
+    
+    def _render_message(self, msg):
+        """Render one chat message"""
+        cached = msg.get('_html')
+        if cached is not None and cached[0] == msg['text'] and cached[1] == msg.get('note'):
+            return cached[2]
+        
+        if msg['type'] == 'user':
+            html = f'''
+                <div style="display: flex; justify-content: flex-end; margin: 10px 0;">
+                    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+                                color: white; padding: 12px 16px; border-radius: 18px; 
+                                max-width: 70%; word-wrap: break-word;">
+                        {self._escape_html(msg['text'])}
                     </div>
-                '''
-            else:
-                html += f'''
-                    <div style="display: flex; justify-content: flex-start; margin: 10px 0;">
-                        <div style="background: #f5f5f5; color: #333; 
-                                    padding: 12px 16px; border-radius: 18px; 
-                                    max-width: 70%; word-wrap: break-word;">
-                            {self._escape_html(msg['text'])}
-                        </div>
+                </div>
+            '''
+        else:
+            # A streamed answer is provisional until the audit settles
+            note = ''
+            if msg.get('provisional'):
+                note = f'<div style="font-size: 11px; color: #888; margin-bottom: 4px;">{self._escape_html(msg.get("note", ""))}</div>'
+            elif msg.get('note'):
+                note = f'<div style="font-size: 11px; color: #888; margin-top: 4px;">{self._escape_html(msg["note"])}</div>'
+            html = f'''
+                <div style="display: flex; justify-content: flex-start; margin: 10px 0;">
+                    <div style="background: #f5f5f5; color: {'#777' if msg.get('provisional') else '#333'}; 
+                                padding: 12px 16px; border-radius: 18px; 
+                                max-width: 70%; word-wrap: break-word;">
+                        {note if msg.get('provisional') else ''}
+                        {self._escape_html(msg['text'])}
+                        {'' if msg.get('provisional') else note}
                     </div>
-                '''
+                </div>
+            '''
         
-        html += '</div>'
+        # Provisional answers still change as tokens stream in
+        if not msg.get('provisional'):
+            msg['_html'] = (msg['text'], msg.get('note'), html)
         return html
     
     def _render_logs(self, logs):
-        """Render log entries with auto-scroll to bottom"""
+        """Render the last UI_LOG_WINDOW log entries with auto-scroll to bottom"""
         # Generate unique ID for this render to ensure scroll happens
         scroll_id = f"log_container_{int(time.time() * 1000)}"
         
@@ -162,21 +209,13 @@ class AICouncilUI:
                         font-family: 'Courier New', monospace; font-size: 12px;">
         '''
         
-        for log in logs:
-            color_map = {
-                "INFO": "#81c784",
-                "WARNING": "#ffb74d",
-                "ERROR": "#e57373"
-            }
-            color = color_map.get(log['level'], "#d4d4d4")
-            
-            html += f'''
-                <div style="margin-bottom: 8px; line-height: 1.5; color: #d4d4d4;">
-                    <span style="color: #4fc3f7;">[{log['timestamp']}]</span>
-                    <span style="color: {color};">[{log['level']}]</span>
-                    {self._escape_html(log['message'])}
-                </div>
-            '''
+        # Each frame re-sends the panel, so only the last UI_LOG_WINDOW entries are in it
+        hidden = max(0, len(logs) - UI_LOG_WINDOW)
+        if hidden:
+            html += f'<div style="color: #888; margin: 2px 0;">{hidden} earlier log entries not shown</div>'
+        
+        # Entries are rendered once, when they are added
+        html += ''.join(log.get('html') or self._render_log_entry(log) for log in logs[hidden:])
         
         html += '</div>'
         
@@ -194,6 +233,23 @@ class AICouncilUI:
         
         return html
     
+    def _render_log_entry(self, log):
+        """Render one log entry"""
+        color_map = {
+            "INFO": "#81c784",
+            "WARNING": "#ffb74d",
+            "ERROR": "#e57373"
+        }
+        color = color_map.get(log['level'], "#d4d4d4")
+        
+        return f'''
+            <div style="margin-bottom: 8px; line-height: 1.5; color: #d4d4d4;">
+                <span style="color: #4fc3f7;">[{log['timestamp']}]</span>
+                <span style="color: {color};">[{log['level']}]</span>
+                {self._escape_html(log['message'])}
+            </div>
+        '''
+    
     def _escape_html(self, text):
         """Escape HTML characters and handle **bold** formatting"""
         # First escape HTML characters
@@ -210,21 +266,53 @@ class AICouncilUI:
         self.status_html.value = self._render_status(status_type, message)
     
     def update_chat(self):
-        """Update chat display"""
-        self.chat_html.value = self._render_chat(self.messages)
+        """Update chat display (on the next frame)"""
+        self._schedule_render('chat')
     
     def update_logs(self):
-        """Update log display"""
-        self.log_html.value = self._render_logs(self.logs)
+        """Update log display (on the next frame)"""
+        self._schedule_render('logs')
+    
+    def _schedule_render(self, panel):
+        """Mark a panel for re-rendering; updates until the next frame are coalesced into one render"""
+        with self.render_lock:
+            self.dirty.add(panel)
+            if self.render_timer is not None:
+                return
+            delay = max(0.0, self.last_render + 1.0 / UI_FRAME_RATE - time.monotonic())
+            self.render_timer = threading.Timer(delay, self._render_frame)
+            self.render_timer.daemon = True
+            self.render_timer.start()
+    
+    def _render_frame(self):
+        """Re-render the panels that changed since the last frame"""
+        with self.render_lock:
+            dirty, self.dirty = self.dirty, set()
+            self.render_timer = None
+            self.last_render = time.monotonic()
+            logs = list(self.logs)
+            messages = list(self.messages)
+        if 'chat' in dirty:
+            self.chat_html.value = self._render_chat(messages)
+            self.earlier_button.layout.display = None if len(messages) > self.chat_window else 'none'
+        if 'logs' in dirty:
+            self.log_html.value = self._render_logs(logs)
+    
+    def on_earlier_clicked(self, b):
+        """Render another page of earlier chat messages"""
+        self.chat_window += UI_CHAT_WINDOW
+        self.update_chat()
     
     def add_log(self, level, message):
-        """Add a log entry"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.logs.append({
-            'timestamp': timestamp,
+        """Add a log entry; the oldest entries are dropped past UI_LOG_RETENTION"""
+        log = {
+            'timestamp': datetime.now().strftime("%H:%M:%S"),
             'level': level,
             'message': message
-        })
+        }
+        log['html'] = self._render_log_entry(log)
+        with self.render_lock:
+            self.logs.append(log)
         self.update_logs()
     
     def initialize_vector_db(self):
@@ -234,13 +322,19 @@ class AICouncilUI:
                 self.add_log("INFO", "Starting AI Council initialization...")
                 self.add_log("INFO", "Loading vector database...")
                 
-                # Capture print statements
-                old_stdout = sys.stdout
-                sys.stdout = LogCapture(self)
+                # Preload the models while the vector DB loads, so the first question is not slower than the rest
+                warm_up = asyncio.run_coroutine_threadsafe(awarm_up_models(), council_loop()) if WARM_UP_MODELS else None
                 
                 self.vs = get_vector_db()
+                self.cache = CouncilCache(embeddings=self.vs.embeddings)
                 
-                sys.stdout = old_stdout
+                if warm_up is not None:
+                    self.add_log("INFO", "Warming up models...")
+                    timings = warm_up.result()
+                    self.add_log("INFO", "Models warm: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items() if seconds is not None))
+                    skipped = [name for name, seconds in timings.items() if seconds is None]
+                    if skipped:
+                        self.add_log("WARNING", "Warm-up skipped, these load on first use: " + ", ".join(skipped))
                 
                 self.add_log("INFO", "Vector database loaded successfully")
                 self.add_log("INFO", "AI Council ready")
@@ -269,17 +363,11 @@ class AICouncilUI:
         """Handle send button click"""
         user_input = self.input_text.value.strip()
         
-        if not user_input or self.is_processing:
+        if not user_input or self.vs is None:
             return
         
-        # Clear input and disable
+        # Clear input; it stays enabled so more questions can be asked while this one runs
         self.input_text.value = ''
-        self.is_processing = True
-        self.input_text.disabled = True
-        self.send_button.disabled = True
-        
-        # Update status
-        self.update_status('processing', 'Processing...')
         
         # Add user message
         self.messages.append({
@@ -288,85 +376,73 @@ class AICouncilUI:
         })
         self.update_chat()
         
-        # Process in background thread
-        thread = threading.Thread(
-            target=self.process_input,
-            args=(user_input,),
-            daemon=True
-        )
-        thread.start()
+        # Process on the shared council event loop
+        asyncio.run_coroutine_threadsafe(self.process_input(user_input), council_loop())
     
-    def process_input(self, user_input):
+    def _begin_question(self):
+        """Track a question in flight for the status indicator"""
+        with self.in_flight_lock:
+            self.in_flight += 1
+            in_flight = self.in_flight
+        self.update_status('processing', f'Processing {in_flight} question(s)...')
+    
+    def _end_question(self):
+        """Release a question"""
+        with self.in_flight_lock:
+            self.in_flight -= 1
+            in_flight = self.in_flight
+        if in_flight:
+            self.update_status('processing', f'Processing {in_flight} question(s)...')
+        else:
+            self.update_status('ready', 'Ready')
+    
+    def _on_council_event(self, message, event):
+        """Show council events: stage progress in the log, the provisional and final answer in the chat"""
+        if event['type'] == 'stage':
+            stage = event['stage'].replace('_', ' ')
+            if event['status'] == 'started':
+                self.add_log("INFO", f"Stage started: {stage}")
+            else:
+                self.add_log("INFO", f"Stage done: {stage} ({event['seconds']:.1f}s)")
+            return
+        if event['type'] == 'leader':
+            message.update(text=event['text'], response_id=event['response_id'],
+                           note=f"Provisional answer from {event['model']}, the council is still deliberating...")
+        elif event['type'] == 'token':
+            if message.get('response_id') != event['response_id']:
+                return
+            message['text'] += event['text']
+        elif event['type'] == 'final':
+            replaced = message.get('response_id') is not None and not event['confirmed']
+            message.update(text=event['text'], response_id=event['response_id'], provisional=False,
+                           note="Replaced by the council's final answer after the audit" if replaced else '')
+        self.update_chat()
+    
+    async def process_input(self, user_input):
         """Process user input through AI Council workflow"""
+        self._begin_question()
+        # Filled in as the council streams: provisional answer first, the final one after the audit
+        message = {'type': 'assistant', 'text': 'The council is working on it...', 'provisional': True, 'note': ''}
+        self.messages.append(message)
+        self.update_chat()
         try:
-            # Capture print statements
-            old_stdout = sys.stdout
-            sys.stdout = LogCapture(self)
-            
             self.add_log("INFO", f"Processing user input: '{user_input}'")
             
-            # Run the workflow
-            context = self.vs.similarity_search(user_input)
-            self.add_log("INFO", "Context retrieved from vector database")
-            
-            responses, user_prompt = generate_expert_response(user_input, context)
-            
-            scoring_matrix = generate_scores(responses, user_prompt)
+            # Retrieval, pipelined generation and scoring, audit and aggregation
+            result = await run_council(user_input, self.vs, cache=self.cache,
+                                       on_event=lambda event: self._on_council_event(message, event))
+            best_response = result['best_response']
             
-            audit, audit_prompt = generate_audit_report(user_input, responses, scoring_matrix)
-            
-            scoring_matrix, averages_json, best_response = audited_scoring_matrix(
-                audit, scoring_matrix, responses
-            )
-            
-            sys.stdout = old_stdout
-            
-            self.add_log("INFO", averages_json)
+            self.add_log("INFO", result['averages'])
             self.add_log("INFO", best_response)
-
-            
-            # Display best response
-            self.messages.append({
-                'type': 'assistant',
-                'text': best_response['text'] if not IS_ONLINE else best_response['text'].content
-            })
-            self.update_chat()
             
         except Exception as e:
-            sys.stdout = old_stdout
             self.add_log("ERROR", f"Processing failed: {str(e)}")
             import traceback
             self.add_log("ERROR", traceback.format_exc())
             
-            self.messages.append({
-                'type': 'assistant',
-                'text': f"Sorry, an error occurred: {str(e)}"
-            })
+            message.update(text=f"Sorry, an error occurred: {str(e)}", provisional=False, note='')
             self.update_chat()
         
         finally:
-            # Re-enable input
-            self.is_processing = False
-            self.input_text.disabled = False
-            self.send_button.disabled = False
-            
-            # Update status
-            self.update_status('ready', 'Ready')
-
-
-class LogCapture:
-    """Capture print statements and redirect to log"""
-    def __init__(self, ui):
-        self.ui = ui
-        self.buffer = StringIO()
-    
-    def write(self, text):
-        if text.strip():
-            self.ui.add_log("INFO", text.strip())
-        self.buffer.write(text)
-    
-    def flush(self):
-        pass
-    
-    def getvalue(self):
-        return self.buffer.getvalue()
+            self._end_question()